@@ -2,45 +2,120 @@ import cv2
 import numpy as np
 from config import THRESHOLDS
 
+# L-канал LAB для серого пикселя (v, v, v): яркость берем из общего GRAY-плана
+_GRAY_RAMP = np.repeat(np.arange(256, dtype=np.uint8).reshape(-1, 1, 1), 3, axis=2)
+LIGHTNESS_LUT = cv2.cvtColor(_GRAY_RAMP, cv2.COLOR_BGR2LAB)[:, 0, 0].copy()
+
+class LumaPlane:
+    def __init__(self, frame, roi=None):
+        h, w = frame.shape[:2]
+        if roi is None: roi = (0, 0, w, h)
+        x1, y1, x2, y2 = [int(v) for v in roi]
+        x1, y1 = min(max(0, x1), w), min(max(0, y1), h)
+        x2, y2 = min(max(x1, x2), w), min(max(y1, y2), h)
+        self.origin = (x1, y1)
+        crop = frame[y1:y2, x1:x2]
+        if crop.size == 0:
+            self.gray = np.zeros((0, 0), dtype=np.uint8)
+        elif crop.ndim == 2:
+            self.gray = crop
+        else:
+            self.gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        self._integral = None
+
+    @property
+    def integral(self):
+        if self._integral is None:
+            self._integral = cv2.integral(self.gray, sdepth=cv2.CV_64F)
+        return self._integral
+
+    def to_local(self, rects):
+        rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        ox, oy = self.origin
+        h, w = self.gray.shape[:2]
+        local = rects - (ox, oy, ox, oy)
+        local[:, [0, 2]] = np.clip(local[:, [0, 2]], 0, w)
+        local[:, [1, 3]] = np.clip(local[:, [1, 3]], 0, h)
+        local[:, 2] = np.maximum(local[:, 0], local[:, 2])
+        local[:, 3] = np.maximum(local[:, 1], local[:, 3])
+        return local
+
+    def region_means(self, rects):
+        local = self.to_local(rects)
+        if self.gray.size == 0: return np.zeros(len(local)), np.zeros(len(local), dtype=bool)
+        ii = self.integral
+        x1, y1, x2, y2 = local.T
+        sums = ii[y2, x2] - ii[y1, x2] - ii[y2, x1] + ii[y1, x1]
+        areas = (x2 - x1) * (y2 - y1)
+        valid = areas > 0
+        means = np.divide(sums, areas, out=np.zeros(len(local)), where=valid)
+        return means, valid
+
+    def bright_ratio(self, rect, threshold):
+        x1, y1, x2, y2 = self.to_local(rect)[0]
+        roi = self.gray[y1:y2, x1:x2]
+        if roi.size == 0: return 0.0
+        return np.count_nonzero(roi > threshold) / roi.size
+
+    def lightness_mean(self, rect):
+        x1, y1, x2, y2 = self.to_local(rect)[0]
+        roi = self.gray[y1:y2, x1:x2]
+        if roi.size == 0: return 0.0
+        return cv2.mean(cv2.LUT(roi, LIGHTNESS_LUT))[0]
+
 class LivenessDetector:
+    LIGHT_POINTS = (1, 234, 454)
+    PATCH_RADIUS = 10
+
+    @staticmethod
+    def center_rect(bbox):
+        x1, y1, x2, y2 = bbox
+        cx, cy = (x1+x2)//2, (y1+y2)//2
+        w_f, h_f = (x2-x1)//4, (y2-y1)//4
+        return (cx-w_f, cy-h_f, cx+w_f, cy+h_f)
+
+    @staticmethod
+    def light_rects(landmarks):
+        r = LivenessDetector.PATCH_RADIUS
+        pts = np.asarray(landmarks)[list(LivenessDetector.LIGHT_POINTS), :2].astype(np.int64)
+        return np.hstack((pts - r, pts + r))
+
+    @staticmethod
+    def extract_features(frame, bbox, landmarks, plane=None):
+        features = {"glare": False, "brightness": 0.0, "light_center": 0.0, "light_edge": 0.0}
+        try:
+            if plane is None: plane = LumaPlane(frame, bbox)
+            ratio = plane.bright_ratio(bbox, THRESHOLDS["specular_threshold"])
+            features["glare"] = ratio > THRESHOLDS["specular_ratio"]
+            features["brightness"] = plane.lightness_mean(LivenessDetector.center_rect(bbox))
+            means, valid = plane.region_means(LivenessDetector.light_rects(landmarks))
+            features["light_center"] = means[0] if valid[0] else 0.0
+            features["light_edge"] = means[1:][valid[1:]].mean() if valid[1:].any() else 0.0
+        except: pass
+        return features
+
     @staticmethod
     def check_specular_highlights(image, bbox):
         try:
-            x1, y1, x2, y2 = bbox
-            h, w, _ = image.shape
-            face = image[max(0,y1):min(h,y2), max(0,x1):min(w,x2)]
-            if face.size == 0: return False
-            gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-            count = np.count_nonzero(gray > THRESHOLDS["specular_threshold"])
-            return (count / gray.size) > THRESHOLDS["specular_ratio"]
+            plane = LumaPlane(image, bbox)
+            if plane.gray.size == 0: return False
+            return plane.bright_ratio(bbox, THRESHOLDS["specular_threshold"]) > THRESHOLDS["specular_ratio"]
         except: return False
 
     @staticmethod
     def get_face_brightness(frame, bbox):
         try:
-            x1, y1, x2, y2 = bbox
-            h, w, _ = frame.shape
-            cx, cy = (x1+x2)//2, (y1+y2)//2
-            w_f, h_f = (x2-x1)//4, (y2-y1)//4
-            face = frame[max(0, cy-h_f):min(h, cy+h_f), max(0, cx-w_f):min(w, cx+w_f)]
-            if face.size == 0: return 0.0
-            lab = cv2.cvtColor(face, cv2.COLOR_BGR2LAB)
-            return np.mean(lab[:,:,0])
+            rect = LivenessDetector.center_rect(bbox)
+            return LumaPlane(frame, rect).lightness_mean(rect)
         except: return 0.0
-        
+
     @staticmethod
     def get_face_light_distribution(frame, landmarks):
         try:
-            h, w, _ = frame.shape
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            nx, ny = int(landmarks[1][0]), int(landmarks[1][1])
-            nose_roi = gray[max(0, ny-10):min(h, ny+10), max(0, nx-10):min(w, nx+10)]
-            c = np.mean(nose_roi) if nose_roi.size > 0 else 0
-            edge_vals = []
-            for idx in [234, 454]:
-                ex, ey = int(landmarks[idx][0]), int(landmarks[idx][1])
-                roi = gray[max(0, ey-10):min(h, ey+10), max(0, ex-10):min(w, ex+10)]
-                if roi.size > 0: edge_vals.append(np.mean(roi))
-            e = np.mean(edge_vals) if edge_vals else 0
+            rects = LivenessDetector.light_rects(landmarks)
+            roi = (rects[:, 0].min(), rects[:, 1].min(), rects[:, 2].max(), rects[:, 3].max())
+            means, valid = LumaPlane(frame, roi).region_means(rects)
+            c = means[0] if valid[0] else 0
+            e = means[1:][valid[1:]].mean() if valid[1:].any() else 0
             return c, e
-        except: return 0.0, 0.0
\ No newline at end of file
+        except: return 0.0, 0.0
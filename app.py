@@ -1,6 +1,7 @@
 import os
 import sys
 import contextlib
+import importlib
 import hashlib
 
 @contextlib.contextmanager
@@ -18,39 +19,58 @@ def suppress_stderr():
     except: yield
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' 
-with suppress_stderr():
-    import tkinter as tk
-    from tkinter import simpledialog, messagebox
-    import cv2
-    import PIL.Image, PIL.ImageTk
-    import numpy as np
-    from lpad_core import FaceProcessor
-
 import time
+import threading
+import tkinter as tk
+from tkinter import simpledialog, messagebox
 from colorama import init, Fore, Style
 from config import *
-from face_id import FaceIDSystem
+from audit import AuditLog
 
 init(autoreset=True)
 
+class LazyModule:
+    # тяжелые модули (cv2, numpy, PIL) грузятся в фоне после показа окна, до этого - только имя
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None: self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
+Image = LazyModule("PIL.Image")
+ImageTk = LazyModule("PIL.ImageTk")
+stats = LazyModule("stats")
+
+def import_modules():
+    # явные import, а не строки LazyModule: по ним PyInstaller находит модули для exe
+    import cv2, numpy, PIL.Image, PIL.ImageTk
+    import stats, engine, enrollment, scheduler
+
 class LPadApp:
     def __init__(self, window, window_title):
         self.window = window
         self.window.title(window_title)
         
+        ensure_dirs()
         self.check_first_run()
-        
-        with suppress_stderr():
-            self.proc = FaceProcessor()
-            dummy = np.zeros((720, 1280, 3), dtype=np.uint8)
-            self.proc.process(dummy)
-        
-        self.id_sys = FaceIDSystem()
-        
+
+        self.proc = None
+        self.id_sys = None
         self.cap = None
-        self.start_camera()
+        self.pipeline = None
+        self.audit = AuditLog()
+        self.ready = False
+        if PIPELINE_SETTINGS["enabled"]: self.progress = {"Конвейер": "...", "Модель": "..."}
+        else: self.progress = {"FaceMesh": "...", "Модель": "...", "Камера": "..."}
 
-        self.video_label = tk.Label(window)
+        self.video_label = tk.Label(window, text="", width=80, height=20, font=("Arial", 14))
         self.video_label.pack(side=tk.TOP, padx=10, pady=10)
 
         self.btn_frame = tk.Frame(window)
@@ -70,25 +90,87 @@ class LPadApp:
         
         self.btn_stop = tk.Button(self.btn_frame, text="СТОП", width=10, height=2, bg="#ffcccc", command=self.stop_mode)
         self.btn_stop.pack(side=tk.LEFT, padx=20)
+        self.set_buttons(tk.DISABLED)
 
         self.mode = "IDLE" 
         self.reg_name = ""
-        self.reg_count = 0
-        
-        self.sec_state = "scan"
-        self.user = ""
-        self.flash_state = 0
-        self.flash_timer = 0
-        self.min_dark_val = 0
-        self.max_light_val = 0
-        self.max_center_bright = 0
-        self.max_edge_bright = 0
-        self.current_thresholds = THRESHOLDS.copy()
-        self.last_check_time = 0
-        self.flash_attempts = 0
-        
-        self.update_video()
+
+        self.photo = None
+        self.preview_buf = None
+        self.rgb_buf = None
+        self.view_key = None
+        self.stats_overlay = STATS_SETTINGS["overlay"]
+        self.shown_flash = 0
+
+        threading.Thread(target=self.load, name="Loader", daemon=True).start()
+        self.wait_ready()
         self.window.mainloop()
+        if self.pipeline: self.pipeline.release_all()
+        self.audit.close()
+
+    def set_buttons(self, state):
+        for btn in (self.btn_reg, self.btn_sec, self.btn_del, self.btn_stop):
+            btn.configure(state=state)
+
+    def load_mesh(self):
+        from lpad_core import FaceProcessor
+        self.proc = FaceProcessor()
+        dummy = np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+        self.proc.process(dummy)
+
+    def load_model(self):
+        from face_id import FaceIDSystem
+        self.id_sys = FaceIDSystem()
+
+    def start_pipeline(self):
+        from pipeline import InferencePipeline
+        self.pipeline = InferencePipeline().start(fps=60)
+
+    def load(self):
+        if PIPELINE_SETTINGS["enabled"]: steps = {"Конвейер": self.start_pipeline, "Модель": self.load_model}
+        else: steps = {"FaceMesh": self.load_mesh, "Модель": self.load_model, "Камера": self.start_camera}
+        def run(name, fn):
+            try:
+                fn()
+                self.progress[name] = "OK"
+            except Exception as e:
+                print(f"[ERR] {name}: {e}")
+                self.progress[name] = "ERR"
+        with suppress_stderr():
+            try: import_modules()
+            except Exception as e:
+                print(f"[ERR] Импорт модулей: {e}")
+                for name in self.progress: self.progress[name] = "ERR"
+                self.ready = True
+                return
+            threads = [threading.Thread(target=run, args=item, daemon=True) for item in steps.items()]
+            for t in threads: t.start()
+            for t in threads: t.join()
+        self.ready = True
+
+    def wait_ready(self):
+        status = "   ".join(f"{name}: {state}" for name, state in self.progress.items())
+        self.video_label.configure(text=f"ЗАГРУЗКА...\n\n{status}")
+        if not self.ready:
+            self.window.after(50, self.wait_ready)
+            return
+        source = self.pipeline or self.cap
+        if (self.proc is None and self.pipeline is None) or self.id_sys is None:
+            messagebox.showerror("Error", f"Не удалось запустить систему!\n{status}")
+            return
+        from engine import LivenessEngine
+        from enrollment import SampleSelector
+        from scheduler import FrameScheduler
+        self.engine = LivenessEngine(THRESHOLDS, display_marks=True)
+        self.selector = SampleSelector()
+        self.sched = FrameScheduler()
+        self.window.bind("<F2>", self.toggle_stats)
+        stats.STATS.set_overlay(self.stats_overlay)
+        stats.STATS.start()
+        if source is not None and source.isOpened():
+            self.video_label.configure(text="", width=0, height=0)
+        self.set_buttons(tk.NORMAL)
+        self.update_video()
 
     def get_hash(self, text):
         return hashlib.sha256(text.encode()).hexdigest()
@@ -141,202 +223,259 @@ class LPadApp:
                 messagebox.showerror("Error", "Пароли не совпадают!")
 
     def start_camera(self):
+        from camera import CameraStream
         if self.cap: self.cap.release()
-        with suppress_stderr():
-            self.cap = cv2.VideoCapture(CAMERA_ID, cv2.CAP_DSHOW)
-            if not self.cap.isOpened():
-                self.cap = cv2.VideoCapture(0)
-            self.cap.set(3, FRAME_WIDTH)
-            self.cap.set(4, FRAME_HEIGHT)
-            self.cap.set(cv2.CAP_PROP_FPS, 60)
+        self.cap = CameraStream(CAMERA_ID, FRAME_WIDTH, FRAME_HEIGHT, fps=60)
+        if not self.cap.open(): raise RuntimeError("камера не открыта")
+        self.cap.start()
 
     def stop_mode(self):
         self.mode = "IDLE"
-        self.flash_state = 0
+        self.engine.flash_state = 0
 
     def delete_user(self):
         if not self.verify_admin(): return
+        if self.id_sys.busy:
+            messagebox.showerror("Error", "Идет обучение модели, подождите.")
+            return
         name = simpledialog.askstring("Delete", "Кого удалить (Имя):")
-        if name: self.id_sys.delete_user(name)
+        if name and self.id_sys.run_async(self.update_model, self.id_sys.delete_user, name):
+            self.audit.log("delete", user=name)
 
     def start_registration(self):
         if not self.verify_admin(): return
+        if self.id_sys.busy:
+            messagebox.showerror("Error", "Идет обучение модели, подождите.")
+            return
         name = simpledialog.askstring("Reg", "Имя нового пользователя:")
         if not name: return
         self.reg_name = name
-        self.reg_count = 0
+        self.selector.reset()
         self.mode = "REG"
 
     def start_security(self):
         if not self.id_sys.trained:
             messagebox.showerror("Error", "База пуста! Сначала добавьте пользователя.")
             return
-        self.sec_state = "scan"
-        self.flash_state = 0
-        self.flash_attempts = 0
-        self.current_thresholds = THRESHOLDS.copy()
+        self.engine.reset()
         self.mode = "SECURITY"
 
-    def update_video(self):
-        if self.cap and self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if ret:
-                frame = cv2.flip(frame, 1)
-                res = self.proc.process(frame)
-                
-                if self.mode == "REG":
-                    self.process_registration(frame, res)
-                elif self.mode == "SECURITY":
-                    frame = self.process_security(frame, res)
-                else:
-                    cv2.putText(frame, "IDLE MODE", (30,50), 1, 2, (200,200,200), 2)
+    def update_model(self, fn, *args):
+        # процесс распознавания перечитывает модель после обучения/удаления
+        ok = fn(*args)
+        if ok and self.pipeline is not None: self.pipeline.reload_model()
+        return ok
 
-                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = PIL.Image.fromarray(rgb)
-                imgtk = PIL.ImageTk.PhotoImage(image=img)
-                self.video_label.imgtk = imgtk
-                self.video_label.configure(image=imgtk)
+    def mesh_stride(self):
+        states = [s.sec_state for _, s in self.engine.current] if self.mode == "SECURITY" else []
+        return self.sched.stride(self.mode, states, self.engine.flash_state)
 
-        self.window.after(10, self.update_video)
+    def update_video(self):
+        sched = self.sched
+        t_tick = sched.begin()
+        if self.pipeline is not None:
+            self.apply_identities()
+            self.pipeline.set_stride(self.mesh_stride())
+            # все кадры идут в логику по порядку, на экран - только последний
+            items = self.pipeline.poll()
+            for i, (slot, frame, frame_ts, res) in enumerate(items):
+                sched.on_frame(frame_ts, meshed=res is not None)
+                render = i == len(items) - 1 and sched.want_render(self.mode, time.time())
+                try: self.handle_frame(frame, res, frame_ts, stats.STATS.clock(), render)
+                finally: self.pipeline.release(slot)
+        elif self.cap and self.cap.isOpened():
+            ret, frame, frame_ts = self.cap.read()
+            if ret:
+                t_frame = stats.STATS.clock()
+                sched.on_frame(frame_ts)
+                mesh = sched.want_mesh(self.mesh_stride())
+                render = sched.want_render(self.mode, time.time())
+                if mesh or render:
+                    frame = cv2.flip(frame, 1)
+                    res = self.proc.process(frame) if mesh else None
+                    self.handle_frame(frame, res, frame_ts, t_frame, render)
+
+        sched.end(t_tick)
+        self.window.after(sched.delay(time.time()), self.update_video)
+
+    def handle_frame(self, frame, res, frame_ts, t_frame, render=True):
+        key = None
+        if self.mode == "REG":
+            self.process_registration(frame, res)
+        elif self.mode == "TRAIN":
+            key = self.process_training(frame)
+        elif self.mode == "SECURITY":
+            key = self.process_security(frame, res, frame_ts)
+        else:
+            cv2.putText(frame, "IDLE MODE", (30,50), 1, 2, (200,200,200), 2)
+
+        if render:
+            if self.stats_overlay and key is None: self.draw_stats(frame)
+            t0 = stats.STATS.clock()
+            shown = self.show_frame(frame, key, native=self.mode == "SECURITY" and self.shown_flash != 0)
+            stats.STATS.stop("render", t0)
+            if shown and self.mode == "SECURITY":
+                self.engine.mark_displayed(self.shown_flash, time.time())
+        stats.STATS.stop("frame", t_frame)
+
+    def toggle_stats(self, event=None):
+        self.stats_overlay = not self.stats_overlay
+        stats.STATS.set_overlay(self.stats_overlay)
+
+    def draw_stats(self, frame):
+        y = frame.shape[0] - 20
+        r = self.sched.report
+        load = f"duty {r['duty'] * 100:4.0f}%  cam {r['fps']:4.1f}  mesh {r['mesh_fps']:4.1f}  view {r['render_fps']:4.1f} fps"
+        for line in reversed([load, "stage       p50    p95    p99"] + stats.STATS.lines()):
+            cv2.putText(frame, line, (20, y), cv2.FONT_HERSHEY_PLAIN, 1.1, (0, 255, 255), 1)
+            y -= 20
+
+    def preview_size(self, w, h, native=False):
+        if native: return w, h
+        win_w = self.window.winfo_width() - 20
+        win_h = self.window.winfo_height() - self.btn_frame.winfo_height() - 60
+        if win_w < 50 or win_h < 50:
+            scale = min(PREVIEW_MAX_WIDTH / w, 1.0)
+        else:
+            scale = min(win_w / w, win_h / h, PREVIEW_MAX_WIDTH / w, 1.0)
+        return max(int(w * scale), 1), max(int(h * scale), 1)
+
+    def show_frame(self, frame, key=None, native=False):
+        # статичный экран (key) перерисовывается только при смене
+        if key is not None and key == self.view_key: return False
+        self.view_key = key
+        if self.window.state() == "iconic": return False
+
+        size = self.preview_size(frame.shape[1], frame.shape[0], native)
+        if self.photo is None or self.photo.width() != size[0] or self.photo.height() != size[1]:
+            self.photo = ImageTk.PhotoImage("RGB", size)
+            self.preview_buf = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self.rgb_buf = np.empty_like(self.preview_buf)
+            self.video_label.configure(image=self.photo)
+
+        src = frame
+        if size != (frame.shape[1], frame.shape[0]):
+            cv2.resize(frame, size, dst=self.preview_buf, interpolation=cv2.INTER_AREA)
+            src = self.preview_buf
+        cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=self.rgb_buf)
+        self.photo.paste(Image.frombuffer("RGB", size, self.rgb_buf, "raw", "RGB", 0, 1))
+        return True
 
     def process_registration(self, frame, res):
-        cv2.putText(frame, f"REC: {self.reg_count}/25", (30, 50), 1, 2, (0, 255, 0), 2)
-        if res["detected"]:
+        sel = self.selector
+        if res is not None and res["detected"]:
             bbox = res["bbox"]
+            if not sel.done:
+                face = self.id_sys.face_crop(frame, bbox)
+                if face is not None: sel.offer(face, res["landmarks"])
             cv2.rectangle(frame, (bbox[0],bbox[1]), (bbox[2],bbox[3]), (0,255,0), 2)
-            if self.reg_count < 25:
-                if self.id_sys.save_sample(frame, bbox, self.reg_name, self.reg_count):
-                    self.reg_count += 1
-            else:
-                cv2.rectangle(frame, (0, 0), (FRAME_WIDTH, FRAME_HEIGHT), (0, 0, 0), -1)
-                cv2.putText(frame, "TRAINING MODEL...", (300, 360), 1, 3, (0, 255, 0), 3)
-                self.window.update_idletasks()
-                self.id_sys.train()
-                self.stop_mode()
+        cv2.putText(frame, f"REC: {len(sel.samples)}/{sel.target}", (30, 50), 1, 2, (0, 255, 0), 2)
+        if sel.last_reason:
+            cv2.putText(frame, sel.last_reason.upper(), (30, 90), 1, 1.2, (0, 200, 255), 1)
+        if sel.done and self.id_sys.run_async(self.update_model, self.id_sys.enroll, self.reg_name, list(sel.samples)):
+            self.audit.log("enroll", user=self.reg_name, samples=len(sel.samples), rejected=sel.rejected)
+            self.mode = "TRAIN"
+
+    def process_training(self, frame):
+        if self.view_key != "TRAIN":
+            frame[:] = 0
+            cv2.putText(frame, "TRAINING MODEL...", (300, 360), 1, 3, (0, 255, 0), 3)
+        if not self.id_sys.busy:
+            self.stop_mode()
+            if self.id_sys.last_result:
                 messagebox.showinfo("Success", f"Пользователь {self.reg_name} добавлен!")
+            else:
+                messagebox.showerror("Error", "Не удалось обучить модель!")
+        return "TRAIN"
+
+    def scan(self, frame, tracks, frame_ts):
+        if self.pipeline is not None:
+            # ответ придет позже (apply_identities), до него трек не запоминает имя
+            self.pipeline.recognize([(t.id, self.id_sys.face_crop(frame, t.bbox)) for t in tracks], frame_ts)
+            return [None] * len(tracks)
+        results = self.id_sys.recognize_batch(frame, [t.bbox for t in tracks])
+        for t, (name, score) in zip(tracks, results):
+            self.audit.log("scan", ts=frame_ts, user=name, score=float(score), track=t.id,
+                           bbox=[int(v) for v in t.bbox])
+        return results
+
+    def apply_identities(self):
+        tracks = {t.id: t for t in self.engine.tracker.tracks}
+        now = time.time()
+        for track_id, frame_ts, name, score in self.pipeline.identities():
+            t = tracks.get(track_id)
+            self.audit.log("scan", ts=frame_ts, user=name, score=score, track=track_id,
+                           bbox=[int(v) for v in t.bbox] if t else None)
+            if t is not None: t.remember(name, score, now)
+
+    def process_security(self, frame, res, frame_ts):
+        eng = self.engine
+        self.shown_flash = eng.flash_state
+
+        events = []
+        # кадр без FaceMesh (пониженная частота в "ok"/"fail"): рамки с прошлого кадра
+        if res is not None:
+            t0 = stats.STATS.clock()
+            events = eng.step_faces(res["faces"], frame_ts, lambda tracks: self.scan(frame, tracks, frame_ts))
+            stats.STATS.stop("engine", t0)
+
+        # затемнение/вспышка в том же буфере после распознавания: frame * a + 255 * b
+        if self.shown_flash == 1:
+            cv2.convertScaleAbs(frame, dst=frame, alpha=0.02)
+        elif self.shown_flash == 2:
+            cv2.convertScaleAbs(frame, dst=frame, alpha=0.15, beta=0.85 * 255)
+
+        for event in events:
+            self.audit.log("decision" if event["final"] else "attempt", **event)
+            if not event["final"]: continue
+            if event["passed"]:
+                print(f"{Fore.GREEN}[OK] {event['user']} | Diff={event['diff']:.1f} | 3D={event['ratio_3d']:.2f} | {event['attempt']}/3{Style.RESET_ALL}")
+            else:
+                print(f"{Fore.RED}[SPOOF DETECTED] {event['user']} | {event['reason']} | Diff={event['diff']:.1f} | 3D={event['ratio_3d']:.2f} | Attempt={event['attempt']}/3{Style.RESET_ALL}")
 
-    def process_security(self, frame, res):
-        overlay = frame.copy()
-        if self.flash_state == 1: 
-            cv2.rectangle(overlay, (0,0), (FRAME_WIDTH, FRAME_HEIGHT), (0,0,0), -1)
-            frame = cv2.addWeighted(overlay, 0.98, frame, 0.02, 0)
-        elif self.flash_state == 2: 
-            cv2.rectangle(overlay, (0,0), (FRAME_WIDTH, FRAME_HEIGHT), (255,255,255), -1)
-            frame = cv2.addWeighted(overlay, 0.85, frame, 0.15, 0)
-
-        msg, sub, col = "SYSTEM ACTIVE", "Scanning...", (255,255,255)
-
-        if res["detected"]:
-            bbox = res["bbox"]
-            brightness = res["brightness"]
-            lc = res["light_center"]
-            le = res["light_edge"]
-            
-            if self.flash_state == 0:
-                cv2.rectangle(frame, (bbox[0],bbox[1]), (bbox[2],bbox[3]), (255,255,0), 2)
-
-            if self.sec_state == "scan":
-                name, conf = self.id_sys.recognize(frame, bbox)
-                if name != "Unknown" and conf > 50:
-                    self.user = name
-                    base_lux = brightness
-                    self.current_thresholds["max_dark_val"] = base_lux + 30.0
-                    if base_lux > 150: self.current_thresholds["min_flash_diff"] = 10.0
-                    else: self.current_thresholds["min_flash_diff"] = 15.0
-                    
-                    self.sec_state = "flash_check"
-                    self.flash_state = 1
-                    self.flash_timer = time.time()
-                    self.min_dark_val = 255.0
-                    self.max_light_val = 0.0
-                    self.flash_attempts = 0
-                else:
-                    col = (0,0,255)
-                    sub = "Unknown User"
-
-            elif self.sec_state == "flash_check":
-                msg = f"VERIFYING: {self.user}"
-                col = (0,255,255)
-                
-                if self.flash_state == 1:
-                    sub = "ANALYZING LIGHT..."
-                    if brightness < self.min_dark_val: self.min_dark_val = brightness
-                    if time.time() - self.flash_timer > 0.6:
-                        self.flash_state = 2
-                        self.flash_timer = time.time()
-                        self.max_center_bright = 0.0
-                        self.max_edge_bright = 0.0
-                
-                elif self.flash_state == 2:
-                    sub = "FLASHING..."
-                    if time.time() - self.flash_timer > 0.3:
-                        if brightness > self.max_light_val: self.max_light_val = brightness
-                        if lc > self.max_center_bright: self.max_center_bright = lc
-                        if le > self.max_edge_bright: self.max_edge_bright = le
-                    
-                    if time.time() - self.flash_timer > 0.8:
-                        diff = self.max_light_val - self.min_dark_val
-                        ratio_3d = self.max_center_bright / (self.max_edge_bright + 0.1)
-                        has_glare = res["glare"]
-                        
-                        passed = True
-                        fail_reason = ""
-                        
-                        is_paper_reflective = diff > THRESHOLDS["max_flash_diff"]
-                        is_super_3d = ratio_3d > 1.50
-                        
-                        if self.min_dark_val > self.current_thresholds["max_dark_val"]:
-                            passed, fail_reason = False, "Too Bright Env"
-                        elif has_glare:
-                            passed, fail_reason = False, "Glare Detected"
-                        elif diff < self.current_thresholds["min_flash_diff"]:
-                            passed, fail_reason = False, "No Reflection"
-                        elif is_paper_reflective and not is_super_3d:
-                            passed, fail_reason = False, "Too Reflective"
-                        elif ratio_3d < THRESHOLDS["min_3d_ratio"]:
-                            passed, fail_reason = False, "Flat Face"
-
-                        if passed:
-                            self.sec_state = "ok"
-                            self.last_check_time = time.time()
-                            self.flash_state = 0
-                            print(f"{Fore.GREEN}[OK] {self.user} | Diff={diff:.1f} | 3D={ratio_3d:.2f} | {self.flash_attempts+1}/3{Style.RESET_ALL}")
-                        else:
-                            self.flash_attempts += 1
-                            if self.flash_attempts >= THRESHOLDS["max_flash_attempts"]:
-                                print(f"{Fore.RED}[SPOOF DETECTED] {self.user} | {fail_reason} | Diff={diff:.1f} | 3D={ratio_3d:.2f} | Attempt={self.flash_attempts}/3{Style.RESET_ALL}")
-                                self.sec_state = "fail"
-                                self.flash_state = 0
-                            else:
-                                self.flash_state = 1
-                                self.flash_timer = time.time()
-                                self.min_dark_val = 255.0
-                                self.max_light_val = 0.0
-
-            elif self.sec_state == "ok":
-                msg = "ACCESS GRANTED"
-                sub = f"Welcome, {self.user}!"
-                col = (0,255,0)
+        states = {}
+        for face, session in eng.current:
+            bbox = face["bbox"]
+            states.setdefault(session.sec_state, []).append(session.user)
+            if session.sec_state == "ok":
                 cv2.rectangle(frame, (bbox[0],bbox[1]), (bbox[2],bbox[3]), (0,255,0), 4)
-                if time.time() - self.last_check_time > THRESHOLDS["reauth_interval"]:
-                    self.sec_state = "scan"
-
-            elif self.sec_state == "fail":
-                msg = "ACCESS DENIED"
-                sub = "SPOOFING DETECTED"
-                col = (0,0,255)
+            elif session.sec_state == "fail":
                 cv2.rectangle(frame, (bbox[0],bbox[1]), (bbox[2],bbox[3]), (0,0,255), 4)
-                if time.time() - self.flash_timer > 5.0:
-                    self.sec_state = "scan"
+            elif self.shown_flash == 0:
+                cv2.rectangle(frame, (bbox[0],bbox[1]), (bbox[2],bbox[3]), (255,255,0), 2)
+            if len(eng.current) > 1 and session.user:
+                cv2.putText(frame, session.user, (bbox[0], max(bbox[1] - 8, 120)), 1, 1.2, (255,255,0), 1)
+
+        msg, sub, col = "SYSTEM ACTIVE", "Scanning...", (255,255,255)
+        if "fail" in states:
+            msg = "ACCESS DENIED"
+            sub = "SPOOFING DETECTED"
+            col = (0,0,255)
+        elif "flash_check" in states:
+            msg = f"VERIFYING: {', '.join(states['flash_check'])}"
+            col = (0,255,255)
+            if eng.flash_state == 1: sub = "ANALYZING LIGHT..."
+            elif eng.flash_state == 2: sub = "FLASHING..."
+        elif "ok" in states:
+            msg = "ACCESS GRANTED"
+            sub = f"Welcome, {', '.join(states['ok'])}!"
+            col = (0,255,0)
+        elif "scan" in states:
+            col = (0,0,255)
+            sub = "Unknown User"
 
         cv2.rectangle(frame, (0,0), (FRAME_WIDTH, 110), (0,0,0), -1)
         cv2.putText(frame, msg, (30, 50), 1, 2.0, col, 2)
         cv2.putText(frame, sub, (30, 90), 1, 1.2, (200,200,200), 1)
-        return frame
+        # темная фаза - почти черный экран: перерисовка только при смене надписей
+        if self.shown_flash == 1: return ("DARK", msg, sub)
+        return None
 
     def __del__(self):
         if self.cap: self.cap.release()
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = LPadApp(root, "L-PAD Security System")
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import queue
+import threading
+from config import AUDIT_SETTINGS
+
+class AuditLog:
+    def __init__(self, settings=AUDIT_SETTINGS):
+        self.settings = settings
+        self.path = os.path.join(settings["dir"], "audit.jsonl")
+        self.queue = queue.Queue(maxsize=settings["queue_size"])
+        self.dropped = 0
+        self.reported = 0
+        self.written = 0
+        self.file = None
+        self.thread = threading.Thread(target=self._run, name="AuditLog", daemon=True)
+        self.thread.start()
+
+    def log(self, kind, **data):
+        data["type"] = kind
+        data.setdefault("ts", time.time())
+        try: self.queue.put_nowait(data)
+        except queue.Full: self.dropped += 1
+
+    def close(self):
+        while True:
+            try:
+                self.queue.put(None, timeout=1.0)
+                break
+            except queue.Full:
+                if not self.thread.is_alive(): break
+        self.thread.join(timeout=5.0)
+
+    def open(self):
+        os.makedirs(self.settings["dir"], exist_ok=True)
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def rotate(self):
+        self.file.close()
+        backups = self.settings["backups"]
+        for i in range(backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src): os.replace(src, f"{self.path}.{i + 1}")
+        if backups > 0: os.replace(self.path, self.path + ".1")
+        else: os.remove(self.path)
+        self.open()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _run(self):
+        s = self.settings
+        try: self.open()
+        except Exception as e:
+            print(f"[ERR] Журнал аудита недоступен: {e}")
+            return
+        last_sync = time.time()
+        pending = False
+        running = True
+        while running:
+            try: batch = [self.queue.get(timeout=s["sync_interval"])]
+            except queue.Empty: batch = []
+            while batch and len(batch) < s["batch_size"]:
+                try: batch.append(self.queue.get_nowait())
+                except queue.Empty: break
+            if None in batch:
+                running = False
+                batch = [e for e in batch if e is not None]
+
+            if self.dropped > self.reported:
+                batch.append({"type": "dropped", "ts": time.time(), "count": self.dropped - self.reported})
+                self.reported = self.dropped
+            try:
+                for event in batch:
+                    self.file.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+                self.written += len(batch)
+                pending = pending or bool(batch)
+                now = time.time()
+                if pending and (now - last_sync >= s["sync_interval"] or not running):
+                    self.sync()
+                    last_sync = now
+                    pending = False
+                    if self.file.tell() >= s["max_bytes"]: self.rotate()
+            except Exception as e:
+                print(f"[ERR] Ошибка записи журнала аудита: {e}")
+        self.file.close()
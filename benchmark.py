@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import cv2
+import numpy as np
+from anti_spoofing import LivenessDetector
+from face_id import FaceIDSystem
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+GALLERIES = [1, 50, 500]
+SAMPLES_PER_USER = 25
+IMAGE_EXT = {".jpg", ".jpeg", ".png", ".bmp"}
+BACKEND_CLASSES = {"lbph": "LBPHBackend", "embedding": "EmbeddingBackend"}
+
+def measure(fn, iterations, warmup=2):
+    for _ in range(warmup): fn()
+    times = []
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return times
+
+def summarize(times):
+    ms = np.array(times) * 1000.0
+    mean = float(ms.mean())
+    return {
+        "n": len(ms),
+        "mean_ms": mean,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "fps": 1000.0 / mean if mean > 0 else None
+    }
+
+def synthetic_frame(w, h, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(40, 200, size=(h // 8, w // 8, 3), dtype=np.uint8)
+    frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_LINEAR)
+    cx, cy, r = w // 2, h // 2, h // 5
+    cv2.ellipse(frame, (cx, cy), (int(r * 0.8), r), 0, 0, 360, (120, 150, 190), -1)
+    return frame
+
+def synthetic_landmarks(w, h, seed=0):
+    rng = np.random.default_rng(seed)
+    cx, cy, r = w // 2, h // 2, h // 5
+    pts = np.column_stack((rng.integers(cx - int(r * 0.8), cx + int(r * 0.8), 478),
+                           rng.integers(cy - r, cy + r, 478))).astype(np.int32)
+    pts[1] = (cx, cy)
+    pts[234] = (cx - int(r * 0.8), cy)
+    pts[454] = (cx + int(r * 0.8), cy)
+    return pts
+
+def load_frames(path):
+    frames = []
+    for name in sorted(os.listdir(path)):
+        if os.path.splitext(name)[1].lower() in IMAGE_EXT:
+            img = cv2.imread(os.path.join(path, name))
+            if img is not None: frames.append(img)
+    return frames
+
+def frame_sets(w, h, recorded):
+    sets = [("synthetic", [synthetic_frame(w, h, i) for i in range(4)])]
+    if recorded:
+        sets.append(("recorded", [cv2.resize(f, (w, h), interpolation=cv2.INTER_AREA) for f in recorded]))
+    return sets
+
+def cycle(items):
+    state = {"i": 0}
+    def nxt():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return item
+    return nxt
+
+def bench_pipeline(results, resolutions, recorded, iterations):
+    from lpad_core import FaceProcessor
+    from detector import FaceGate
+    gate = FaceGate()
+    for w, h in resolutions:
+        for source, frames in frame_sets(w, h, recorded):
+            # свой процессор на каждый набор: ROI и трекинг FaceMesh от прошлого разрешения искажают первые кадры
+            proc = FaceProcessor(use_gate=False)
+            base = {"resolution": f"{w}x{h}", "source": source}
+            nxt = cycle(frames)
+            results.append(dict(base, stage="FaceProcessor.process", **summarize(measure(lambda: proc.process(nxt()), iterations))))
+            if gate.enabled:
+                results.append(dict(base, stage="FaceGate.detect", **summarize(measure(lambda: gate.detect(nxt()), iterations))))
+
+            faces = []
+            for f in frames:
+                res = proc.process(f)
+                if res["detected"]: faces.append((f, res["bbox"], res["landmarks"]))
+            if not faces:
+                faces = [(f, None, synthetic_landmarks(w, h, i)) for i, f in enumerate(frames)]
+                faces = [(f, (int(p[:, 0].min()), int(p[:, 1].min()), int(p[:, 0].max()), int(p[:, 1].max())), p) for f, _, p in faces]
+            base["faces"] = len(faces)
+            nxt = cycle(faces)
+            stages = [
+                ("LivenessDetector.extract_features", lambda f, b, p: LivenessDetector.extract_features(f, b, p)),
+                ("LivenessDetector.check_specular_highlights", lambda f, b, p: LivenessDetector.check_specular_highlights(f, b)),
+                ("LivenessDetector.get_face_brightness", lambda f, b, p: LivenessDetector.get_face_brightness(f, b)),
+                ("LivenessDetector.get_face_light_distribution", lambda f, b, p: LivenessDetector.get_face_light_distribution(f, p)),
+            ]
+            for name, fn in stages:
+                results.append(dict(base, stage=name, **summarize(measure(lambda: fn(*nxt()), iterations))))
+            print(f"[OK] pipeline {w}x{h} ({source})")
+
+def make_gallery(users_dir, users, samples, seed=0):
+    rng = np.random.default_rng(seed)
+    for u in range(users):
+        path = os.path.join(users_dir, f"user_{u:04d}")
+        os.makedirs(path, exist_ok=True)
+        base = cv2.resize(rng.integers(0, 256, size=(25, 25), dtype=np.uint8), (200, 200))
+        for s in range(samples):
+            noise = rng.normal(0, 12, size=(200, 200))
+            img = np.clip(base + noise, 0, 255).astype(np.uint8)
+            cv2.imwrite(os.path.join(path, f"{s}.jpg"), img)
+
+def bench_recognition(results, resolutions, galleries, samples, recorded, iterations, train_iterations, backend):
+    for users in galleries:
+        tmp = tempfile.mkdtemp(prefix="lpad_bench_")
+        try:
+            users_dir = os.path.join(tmp, "users")
+            make_gallery(users_dir, users, samples)
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                id_sys = FaceIDSystem(users_dir, os.path.join(tmp, "face_trainer.yml"), backend=backend)
+            # create_backend молча переходит на LBPH (например, нет scaler.pkl) - такие цифры не подписываем чужим именем
+            actual = type(id_sys.backend).__name__
+            if actual != BACKEND_CLASSES.get(backend, actual):
+                print(f"[ERR] Backend {backend} недоступен (загружен {actual}), замеры пропущены.")
+                return
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                base = {"backend": backend, "backend_class": actual, "gallery_users": users, "gallery_samples": users * samples}
+                results.append(dict(base, stage="FaceIDSystem.train", **summarize(measure(id_sys.train, train_iterations, warmup=0))))
+            for w, h in resolutions:
+                for source, frames in frame_sets(w, h, recorded):
+                    bbox = (w // 2 - h // 5, h // 2 - h // 4, w // 2 + h // 5, h // 2 + h // 4)
+                    nxt = cycle(frames)
+                    times = measure(lambda: id_sys.recognize(nxt(), bbox), iterations)
+                    results.append(dict(base, stage="FaceIDSystem.recognize", resolution=f"{w}x{h}", source=source, **summarize(times)))
+            print(f"[OK] recognition {backend} {users} x {samples}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def parse_sizes(text):
+    return [tuple(int(v) for v in s.lower().split("x")) for s in text.split(",") if s]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="L-PAD per-stage latency benchmark")
+    parser.add_argument("--frames", help="folder with recorded frames (images)")
+    parser.add_argument("--sizes", default=",".join(f"{w}x{h}" for w, h in RESOLUTIONS))
+    parser.add_argument("--galleries", default=",".join(map(str, GALLERIES)))
+    parser.add_argument("--backends", default="lbph,embedding")
+    parser.add_argument("--samples", type=int, default=SAMPLES_PER_USER)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--train-iterations", type=int, default=3)
+    parser.add_argument("--skip", default="", help="comma separated: pipeline,recognition")
+    parser.add_argument("--out", default="benchmark.json")
+    args = parser.parse_args(argv)
+
+    resolutions = parse_sizes(args.sizes)
+    galleries = [int(v) for v in args.galleries.split(",") if v]
+    skip = set(args.skip.split(","))
+    recorded = load_frames(args.frames) if args.frames else []
+
+    results = []
+    if "pipeline" not in skip:
+        bench_pipeline(results, resolutions, recorded, args.iterations)
+    if "recognition" not in skip:
+        for backend in args.backends.split(","):
+            bench_recognition(results, resolutions, galleries, args.samples, recorded, args.iterations, args.train_iterations, backend)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "iterations": args.iterations
+        },
+        "results": results
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for r in results:
+        where = " ".join(v for v in (r.get("resolution"), r.get("source")) if v)
+        if "gallery_users" in r: where = f"{where} {r['backend']} users={r['gallery_users']}".strip()
+        print(f"{r['stage']:<46} {where:<32} p50={r['p50_ms']:8.2f} p95={r['p95_ms']:8.2f} p99={r['p99_ms']:8.2f} ms  {r['fps']:8.1f} fps")
+    print(f"[OK] Результаты сохранены: {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
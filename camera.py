@@ -0,0 +1,89 @@
+import time
+import threading
+import cv2
+from config import CAMERA_ID, FRAME_WIDTH, FRAME_HEIGHT
+from stats import STATS
+
+class CameraStream:
+    def __init__(self, src=CAMERA_ID, width=FRAME_WIDTH, height=FRAME_HEIGHT, fps=60, max_failures=0):
+        self.src = src
+        self.width = width
+        self.height = height
+        self.fps = fps
+        # 0 - ждать камеру бесконечно, N - остановиться после N неудачных чтений подряд
+        self.max_failures = max_failures
+        self.failures = 0
+        self.cap = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+        self.frame = None
+        self.frame_ts = 0.0
+        self.frame_seq = 0
+        self.last_read_seq = 0
+        self.captured = 0
+        self.dropped = 0
+        self.processed = 0
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.src, cv2.CAP_DSHOW)
+        if not self.cap.isOpened():
+            self.cap = cv2.VideoCapture(self.src)
+        self.cap.set(3, self.width)
+        self.cap.set(4, self.height)
+        self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+        return self.cap.isOpened()
+
+    def start(self):
+        if self.running: return self
+        if self.cap is None: self.open()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="CameraStream", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            t0 = STATS.clock()
+            ret, frame = self.cap.read()
+            STATS.stop("capture", t0)
+            ts = time.time()
+            if not ret:
+                self.failures += 1
+                if self.max_failures and self.failures >= self.max_failures:
+                    self.running = False
+                    break
+                time.sleep(0.01)
+                continue
+            self.failures = 0
+            with self.lock:
+                if self.frame_seq > self.last_read_seq:
+                    self.dropped += 1
+                self.frame = frame
+                self.frame_ts = ts
+                self.frame_seq += 1
+                self.captured += 1
+
+    def read(self):
+        with self.lock:
+            if self.frame is None or self.frame_seq == self.last_read_seq:
+                return False, None, 0.0
+            self.last_read_seq = self.frame_seq
+            self.processed += 1
+            return True, self.frame, self.frame_ts
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def stats(self):
+        with self.lock:
+            return {"captured": self.captured, "dropped": self.dropped, "processed": self.processed}
+
+    def release(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+        if self.cap: self.cap.release()
+        self.cap = None
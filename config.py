@@ -7,12 +7,19 @@ DATA_DIR = "data"
 USERS_DIR = os.path.join(DATA_DIR, "users")
 MODELS_DIR = "models"
 MODEL_FILE = os.path.join(MODELS_DIR, "face_trainer.yml")
+SCALER_FILE = os.path.join(MODELS_DIR, "scaler.pkl")
+DETECTOR_PROTO = os.path.join(MODELS_DIR, "face_detector", "deploy.prototxt")
+DETECTOR_MODEL = os.path.join(MODELS_DIR, "face_detector", "res10_300x300_ssd_iter_140000_fp16.caffemodel")
 PASSWORD_FILE = os.path.join(DATA_DIR, "admin.secret")
 
 CAMERA_ID = 0
 FRAME_WIDTH = 1280
 FRAME_HEIGHT = 720
 
+# Максимальная ширина превью в окне (кадр масштабируется под окно).
+# Превью во время вспышки - источник света: оно всегда в полном размере кадра.
+PREVIEW_MAX_WIDTH = FRAME_WIDTH
+
 TARGET_SCORE = 100 
 
 THRESHOLDS = {
@@ -29,14 +36,208 @@ THRESHOLDS = {
     
     # Максимальная яркость в темноте (защита от экранов).
     "max_dark_val": 110.0,   
+
+    # Во время проверки порог темноты = яркость лица до вспышки + запас.
+    "dark_margin": 30.0,
     
     # Параметры бликов (Гистограмма).
     "specular_threshold": 250,
     "specular_ratio": 0.01,
     
-    "max_flash_attempts": 3,
-    "reauth_interval": 30.0
+    "max_flash_attempts": 3
+}
+
+FLASH_SETTINGS = {
+    # Длительность фаз по времени захвата кадров (сек).
+    "dark_duration": 0.6,
+    "light_settle": 0.3,
+    "light_duration": 0.8,
+
+    # Экспозиция кадра (сек): кадр учитывается, если целиком снят внутри фазы.
+    "exposure": 1 / 30,
+
+    # Задержка экран -> камера (сек), подстраивается после каждой вспышки.
+    "latency": 0.1,
+    "max_latency": 0.5,
+    "latency_alpha": 0.3,
+
+    # Последовательное решение: выход из фазы, как только оценки по кадрам
+    # (усеченное среднее/медиана +- z * ст. ошибка) однозначно проходят или нет.
+    "sequential": True,
+    "ring_size": 32,
+    "min_samples": 3,
+    "min_dark": 0.2,
+
+    # Светлая фаза: кадры берутся только после light_settle (экран уже разгорелся),
+    # решение - не раньше чем через min_light после этого.
+    "min_light": 0.1,
+    "max_dark_std": 4.0,
+    "z": 2.0,
+
+    # Нижняя граница ст. ошибки яркости (уровни 0..255): яркость лица квантуется
+    # по 1 уровню и дрожит на 1-2 уровня от кадра к кадру даже у неподвижного лица,
+    # поэтому по 3-5 одинаковым кадрам оценка не может быть точнее ~1 уровня.
+    # При z = 2 ранний выход требует запаса от порога не меньше 2-3 уровней.
+    "min_se": 1.0,
+    "min_ratio_se": 0.02
+}
+
+TRACK_SETTINGS = {
+    # Минимальный IoU bbox между кадрами, чтобы считать лицо тем же.
+    "min_iou": 0.3,
+
+    # Максимальный сдвиг landmarks между кадрами (доля размера лица).
+    "max_shift": 0.25,
+
+    # Сколько секунд трек живет без лица в кадре.
+    "max_gap": 0.5,
+
+    # Повторное распознавание, если IoU с bbox на момент распознавания ниже порога.
+    "drift_iou": 0.5,
+
+    # Блокировка имени после max_flash_attempts неудачных вспышек (сек).
+    # Попытки и блокировка привязаны к имени, а не к треку.
+    "lockout": 5.0,
+
+    # Как часто повторять распознавание для "Unknown" (сек).
+    "retry_interval": 0.3,
+
+    # Сессия действует, пока трек в кадре; это только страховочный предел без новой вспышки (сек).
+    "max_session": 300.0,
+
+    # Повторная вспышка каждые N сек, даже если трек не прерывался (0 - выкл.).
+    # 30.0 - прежнее поведение (reauth_interval), если нужна периодическая перепроверка.
+    "reauth_interval": 0.0
+}
+
+RECOGNITION = {
+    # "lbph" или "embedding" (векторы признаков + scaler.pkl).
+    "backend": "lbph",
+
+    # Порог расстояния между нормированными векторами (0..2), score = 50 на пороге.
+    "max_distance": 0.8
+}
+
+MESH_SETTINGS = {
+    # Сколько лиц обрабатывать одновременно (>1 отключает окно вокруг лица).
+    "max_faces": 1,
+
+    # Запуск FaceMesh в окне вокруг лица с прошлого кадра.
+    "tracking": True,
+
+    # Максимальная сторона изображения, которое подается в FaceMesh.
+    "max_side": 640,
+
+    # Запас окна вокруг лица (доля от размера лица).
+    "roi_pad": 0.6,
+
+    # Смещение/изменение размера лица, после которого окно перестраивается.
+    "roi_drift": 0.25
+}
+
+GATE_SETTINGS = {
+    # Быстрый SSD-детектор перед FaceMesh, пока перед камерой никого нет.
+    "enabled": True,
+
+    # Размер входа сети (меньше 300 = быстрее).
+    "input_size": 160,
+
+    # Как часто проверять пустую сцену (сек).
+    "idle_interval": 0.3,
+
+    # Уверенность детектора для запуска FaceMesh.
+    "confidence": 0.5,
+
+    # Сколько кадров подряд без лица до возврата в режим ожидания.
+    "release_frames": 15
+}
+
+STATS_SETTINGS = {
+    # Таймеры этапов (захват, FaceMesh, признаки, распознавание, логика, отрисовка).
+    # F2 в окне включает сбор и оверлей на лету.
+    "enabled": False,
+    "overlay": False,
+
+    # Сколько последних замеров хранить на этап.
+    "window": 512,
+
+    # JSON-снимок в файл (None = выкл.) и HTTP на 127.0.0.1 (0 = выкл.).
+    "dump_file": None,
+    "dump_interval": 5.0,
+    "http_port": 0
+}
+
+AUDIT_SETTINGS = {
+    # JSONL журнал сканирований, попыток вспышки и решений.
+    "dir": os.path.join(DATA_DIR, "audit"),
+
+    # Очередь в памяти; при переполнении события отбрасываются (счетчик dropped).
+    "queue_size": 2048,
+    "batch_size": 256,
+
+    # Как часто делать fsync (сек).
+    "sync_interval": 1.0,
+
+    # Ротация: размер файла и число архивов audit.jsonl.N.
+    "max_bytes": 10 * 1024 * 1024,
+    "backups": 5
+}
+
+SCHEDULER_SETTINGS = {
+    # Опрос камеры по ее реальной частоте и пропуск ненужных этапов по режиму.
+    "enabled": True,
+
+    # IDLE: без FaceMesh, превью с такой частотой (к/с).
+    "idle_fps": 10,
+
+    # Все лица уже в "ok"/"fail": FaceMesh на каждом N-м кадре.
+    "settled_stride": 3,
+
+    # Пределы паузы до следующего опроса (мс).
+    "min_delay": 2,
+    "max_delay": 50,
+
+    # Окно расчета загрузки (duty cycle), сек.
+    "report_interval": 2.0
+}
+
+PIPELINE_SETTINGS = {
+    # Захват, FaceMesh/признаки и распознавание в отдельных процессах.
+    # Кадры передаются через кольцо shared memory, в UI приходят только результаты.
+    "enabled": False,
+
+    # Слотов в кольце: когда все заняты, камера отбрасывает новые кадры.
+    "slots": 6,
+
+    # Сколько ждать загрузки FaceMesh и модели в процессах (сек).
+    "start_timeout": 60.0
+}
+
+ENROLL_SETTINGS = {
+    # Сколько снимков оставить в галерее пользователя.
+    "target_samples": 15,
+
+    # Минимум снимков, если время регистрации вышло.
+    "min_samples": 5,
+    "max_duration": 30.0,
+
+    # Резкость (дисперсия Лапласиана) и экспозиция кропа 200x200.
+    "min_sharpness": 40.0,
+    "min_exposure": 50.0,
+    "max_exposure": 210.0,
+    "max_clipped": 0.15,
+
+    # Допустимый поворот головы (доли полуширины/полувысоты лица).
+    "max_yaw": 0.45,
+    "max_pitch": 0.35,
+
+    # Снимков на одну позу (3x3 ячейки по yaw/pitch).
+    "per_pose_bin": 4,
+
+    # Порог похожести миниатюр 32x32 (средняя разница после нормировки).
+    "min_difference": 0.25
 }
 
-os.makedirs(USERS_DIR, exist_ok=True)
-os.makedirs(MODELS_DIR, exist_ok=True)
\ No newline at end of file
+def ensure_dirs():
+    os.makedirs(USERS_DIR, exist_ok=True)
+    os.makedirs(MODELS_DIR, exist_ok=True)
\ No newline at end of file
@@ -0,0 +1,69 @@
+import time
+import cv2
+import numpy as np
+from config import DETECTOR_PROTO, DETECTOR_MODEL, GATE_SETTINGS
+
+class FaceGate:
+    def __init__(self, settings=GATE_SETTINGS, proto=DETECTOR_PROTO, model=DETECTOR_MODEL):
+        self.settings = settings
+        self.net = None
+        size = settings["input_size"]
+        if settings["enabled"]:
+            try:
+                self.net = cv2.dnn.readNetFromCaffe(proto, model)
+                self.detect(np.zeros((size, size, 3), dtype=np.uint8))
+            except Exception:
+                self.net = None
+                print("[ERR] SSD-детектор не загружен, FaceMesh работает на каждом кадре.")
+        self.active = False
+        self.misses = 0
+        self.last_check = 0.0
+        self.last_confidence = 0.0
+
+    @property
+    def enabled(self):
+        return self.net is not None
+
+    def detect(self, frame):
+        size = self.settings["input_size"]
+        small = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+        blob = cv2.dnn.blobFromImage(small, 1.0, (size, size), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        det = self.net.forward()
+        conf = det[0, 0, :, 2]
+        return float(conf.max()) if conf.size else 0.0
+
+    def check(self, frame, now=None):
+        gate = {"run_mesh": True, "state": "active", "ran_detector": False,
+                "confidence": self.last_confidence, "time_ms": 0.0}
+        if not self.enabled or self.active: return gate
+
+        now = time.time() if now is None else now
+        gate["state"] = "idle"
+        if now - self.last_check < self.settings["idle_interval"]:
+            gate["run_mesh"] = False
+            return gate
+
+        t = time.perf_counter()
+        self.last_check = now
+        self.last_confidence = self.detect(frame)
+        gate["time_ms"] = (time.perf_counter() - t) * 1000.0
+        gate["ran_detector"] = True
+        gate["confidence"] = self.last_confidence
+        if self.last_confidence >= self.settings["confidence"]:
+            self.active = True
+            self.misses = 0
+            gate["state"] = "active"
+        else:
+            gate["run_mesh"] = False
+        return gate
+
+    def update(self, detected):
+        if not self.enabled or not self.active: return
+        if detected:
+            self.misses = 0
+            return
+        self.misses += 1
+        if self.misses >= self.settings["release_frames"]:
+            self.active = False
+            self.last_check = 0.0
@@ -0,0 +1,114 @@
+import os
+import cv2
+import numpy as np
+from config import SCALER_FILE, RECOGNITION
+
+def face_features(face):
+    small = cv2.resize(face, (100, 100))
+    hist = np.bincount((small >> 4).ravel(), minlength=16)
+    pixels = cv2.resize(face, (32, 32))
+    return np.concatenate((hist, pixels.ravel())).astype(np.float32)
+
+class FeatureScaler:
+    def __init__(self, path=SCALER_FILE):
+        import joblib
+        scaler = joblib.load(path)
+        self.mean = np.asarray(scaler.mean_, dtype=np.float32)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float32)
+
+    def transform(self, x):
+        x = (np.atleast_2d(x) - self.mean) / self.scale
+        norms = np.linalg.norm(x, axis=1, keepdims=True)
+        return x / np.maximum(norms, 1e-6)
+
+class EmbeddingBackend:
+    def __init__(self, gallery_file, max_distance=RECOGNITION["max_distance"]):
+        self.gallery_file = gallery_file
+        self.max_distance = max_distance
+        self.scaler = FeatureScaler()
+        self.clear()
+
+    @property
+    def trained(self):
+        return len(self.labels) > 0
+
+    def clear(self):
+        self.vectors = np.zeros((0, len(self.scaler.mean)), dtype=np.float32)
+        self.labels = np.zeros(0, dtype=np.int32)
+        self.reindex()
+
+    def reindex(self):
+        order = np.argsort(self.labels, kind="stable")
+        self.vectors = np.ascontiguousarray(self.vectors[order])
+        self.labels = self.labels[order]
+        self.starts = np.flatnonzero(np.r_[True, self.labels[1:] != self.labels[:-1]]) if len(self.labels) else np.zeros(0, dtype=np.intp)
+        self.users = self.labels[self.starts]
+
+    def embed(self, faces):
+        if not len(faces): return np.zeros((0, len(self.scaler.mean)), dtype=np.float32)
+        feats = np.stack([face_features(f) for f in faces])
+        return np.ascontiguousarray(self.scaler.transform(feats), dtype=np.float32)
+
+    def load(self):
+        self.clear()
+        if not os.path.exists(self.gallery_file): return
+        try:
+            with np.load(self.gallery_file) as data:
+                self.vectors = np.ascontiguousarray(data["vectors"], dtype=np.float32)
+                self.labels = np.ascontiguousarray(data["labels"], dtype=np.int32)
+            self.reindex()
+        except: self.clear()
+
+    def save(self):
+        if not self.trained:
+            if os.path.exists(self.gallery_file): os.remove(self.gallery_file)
+            return
+        tmp = self.gallery_file + ".tmp.npz"
+        np.savez(tmp, vectors=self.vectors, labels=self.labels)
+        os.replace(tmp, self.gallery_file)
+
+    def train(self, faces, ids):
+        self.vectors = self.embed(faces)
+        self.labels = np.asarray(ids, dtype=np.int32)
+        self.reindex()
+
+    def add(self, faces, ids):
+        self.vectors = np.concatenate((self.vectors, self.embed(faces)))
+        self.labels = np.concatenate((self.labels, np.asarray(ids, dtype=np.int32)))
+        self.reindex()
+
+    def remove(self, label):
+        keep = self.labels != label
+        self.vectors = self.vectors[keep]
+        self.labels = self.labels[keep]
+        self.reindex()
+
+    def match(self, queries, k=1):
+        q = self.embed(queries)
+        if not self.trained or not len(q): return [[] for _ in range(len(q))]
+        # единичные векторы: |a-b|^2 = 2 - 2 a.b
+        dist = np.sqrt(np.maximum(2.0 - 2.0 * (q @ self.vectors.T), 0.0))
+        best = np.minimum.reduceat(dist, self.starts, axis=1)
+        k = min(k, len(self.users))
+        top = np.argpartition(best, k - 1, axis=1)[:, :k]
+        out = []
+        for row, idx in zip(best, top):
+            idx = idx[np.argsort(row[idx])]
+            out.append([(int(self.users[i]), float(row[i])) for i in idx])
+        return out
+
+    def score(self, distance):
+        return float(np.clip(100.0 * (1.0 - distance / (2.0 * self.max_distance)), 0.0, 100.0))
+
+    def predict_batch(self, faces):
+        results = []
+        for matches in self.match(faces, k=1):
+            if not matches:
+                results.append((-1, 0))
+                continue
+            label, distance = matches[0]
+            results.append((label, self.score(distance)))
+        return results
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
@@ -0,0 +1,351 @@
+import numpy as np
+from config import THRESHOLDS, TRACK_SETTINGS, FLASH_SETTINGS
+from tracker import FaceTracker
+
+class SampleRing:
+    def __init__(self, size):
+        self.buf = np.zeros(size, dtype=np.float64)
+        self.n = 0
+
+    def clear(self):
+        self.n = 0
+
+    def append(self, value):
+        self.buf[self.n % len(self.buf)] = value
+        self.n += 1
+
+    def __len__(self):
+        return min(self.n, len(self.buf))
+
+    def values(self):
+        return self.buf[:len(self)]
+
+    def median(self):
+        return float(np.median(self.values()))
+
+    def trimmed_mean(self, cut=0.2):
+        v = np.sort(self.values())
+        k = int(len(v) * cut)
+        return float(v[k:len(v) - k].mean())
+
+    def var(self):
+        return float(self.values().var(ddof=1)) if len(self) > 1 else 0.0
+
+    def sem(self):
+        return (self.var() / max(len(self), 1)) ** 0.5
+
+class FaceSession:
+    def __init__(self, engine, track):
+        self.engine = engine
+        self.thresholds = engine.thresholds
+        self.flash = engine.flash
+        self.track = track
+        size = self.flash["ring_size"]
+        self.dark = SampleRing(size)
+        self.light = SampleRing(size)
+        self.ratio = SampleRing(size)
+        self.sec_state = "scan"
+        self.user = ""
+        self.current_thresholds = self.thresholds.copy()
+        self.last_check_time = 0
+        self.fail_time = 0
+        self.flash_attempts = 0
+        self.in_flash = False
+        self.start_attempt(0)
+
+    def begin(self, name, brightness, now):
+        self.user = name
+        # попытки и блокировка считаются по имени: новый трек того же лица их не сбрасывает
+        fail_time = self.engine.fail_times.get(name)
+        if fail_time is not None and now - fail_time <= self.engine.tracker.settings["lockout"]:
+            self.sec_state = "fail"
+            self.fail_time = fail_time
+            return
+        base_lux = brightness
+        self.current_thresholds["max_dark_val"] = base_lux + self.thresholds["dark_margin"]
+        if base_lux > 150: self.current_thresholds["min_flash_diff"] = 10.0
+        else: self.current_thresholds["min_flash_diff"] = self.thresholds["min_flash_diff"]
+        self.sec_state = "flash_check"
+        self.flash_attempts = self.engine.attempts.get(name, 0)
+
+    def start_attempt(self, now):
+        self.min_dark_val = 255.0
+        self.max_light_val = 0.0
+        self.max_center_bright = 0.0
+        self.max_edge_bright = 0.0
+        self.light_samples = []
+        self.attempt_start = now
+        self.dark.clear()
+        self.light.clear()
+        self.ratio.clear()
+
+    def clear_phase(self, state):
+        # кадры, собранные до показа экрана, не относятся к фазе
+        if state == 1:
+            self.min_dark_val = 255.0
+            self.dark.clear()
+        else:
+            self.max_light_val = self.max_center_bright = self.max_edge_bright = 0.0
+            self.light.clear()
+            self.ratio.clear()
+
+    def verdict(self, dark, diff, ratio_3d, has_glare):
+        passed = True
+        fail_reason = ""
+
+        is_paper_reflective = diff > self.thresholds["max_flash_diff"]
+        is_super_3d = ratio_3d > 1.50
+
+        if dark > self.current_thresholds["max_dark_val"]:
+            passed, fail_reason = False, "Too Bright Env"
+        elif has_glare:
+            passed, fail_reason = False, "Glare Detected"
+        elif diff < self.current_thresholds["min_flash_diff"]:
+            passed, fail_reason = False, "No Reflection"
+        elif is_paper_reflective and not is_super_3d:
+            passed, fail_reason = False, "Too Reflective"
+        elif ratio_3d < self.thresholds["min_3d_ratio"]:
+            passed, fail_reason = False, "Flat Face"
+        return passed, fail_reason
+
+    def evaluate(self, has_glare):
+        diff = self.max_light_val - self.min_dark_val
+        ratio_3d = self.max_center_bright / (self.max_edge_bright + 0.1)
+        passed, fail_reason = self.verdict(self.min_dark_val, diff, ratio_3d, has_glare)
+        return passed, fail_reason, diff, ratio_3d
+
+    def dark_settled(self, elapsed):
+        fl = self.flash
+        if len(self.dark) < fl["min_samples"] or elapsed < fl["min_dark"]: return False
+        return self.dark.var() ** 0.5 <= fl["max_dark_std"]
+
+    def dark_verdict(self, elapsed):
+        fl = self.flash
+        if len(self.dark) < fl["min_samples"] or elapsed < fl["min_dark"]: return None
+        dark = self.dark.trimmed_mean()
+        if dark - fl["z"] * max(self.dark.sem(), fl["min_se"]) > self.current_thresholds["max_dark_val"]:
+            return False, "Too Bright Env", 0.0, 0.0
+        return None
+
+    def sequential(self, has_glare):
+        # Решение до конца окна, только если все углы доверительного интервала согласны
+        fl = self.flash
+        z = fl["z"]
+        dark, light, ratio_3d = self.dark.trimmed_mean(), self.light.trimmed_mean(), self.ratio.median()
+        dark_se = max(self.dark.sem(), fl["min_se"])
+        diff_se = (dark_se ** 2 + max(self.light.sem(), fl["min_se"]) ** 2) ** 0.5
+        ratio_se = max(self.ratio.sem(), fl["min_ratio_se"])
+        diff = light - dark
+        passes = [self.verdict(dark + a * z * dark_se, diff + b * z * diff_se, ratio_3d + c * z * ratio_se, has_glare)[0]
+                  for a in (-1, 1) for b in (-1, 1) for c in (-1, 1)]
+        # пороги подобраны по max/min, а среднее занижает разницу и пропускает "Too Reflective":
+        # досрочный проход, только если полное окно проходит и с запасом на рост max-min до конца фазы
+        full, _, full_diff, full_ratio = self.evaluate(has_glare)
+        spread = z * (self.dark.var() ** 0.5 + self.light.var() ** 0.5)
+        if all(passes) and full and self.verdict(self.min_dark_val, full_diff + spread, full_ratio, has_glare)[0]:
+            return True, "", diff, ratio_3d
+        if not any(passes) and not full:
+            return (False, self.verdict(dark, diff, ratio_3d, has_glare)[1], diff, ratio_3d)
+        return None
+
+    def measure_dark(self, face, now):
+        eng, fl = self.engine, self.flash
+        start = eng.phase_start(1)
+        if now < start: return None
+        brightness = face["brightness"]
+        if brightness < self.min_dark_val: self.min_dark_val = brightness
+        self.dark.append(brightness)
+        if not fl["sequential"]: return None
+        result = self.dark_verdict(now - start)
+        return result and (result, (self.min_dark_val, self.min_dark_val))
+
+    def measure_light(self, face, now, timeout):
+        eng, fl = self.engine, self.flash
+        start = eng.phase_start(2)
+        brightness, lc, le = face["brightness"], face["light_center"], face["light_edge"]
+        if 2 in eng.shown and now >= eng.shown[2]: self.light_samples.append((now, brightness))
+        # пока экран разгорается, яркость занижена: ни максимумы, ни ранний выход по ней
+        if now - start > fl["light_settle"]:
+            if brightness > self.max_light_val: self.max_light_val = brightness
+            if lc > self.max_center_bright: self.max_center_bright = lc
+            if le > self.max_edge_bright: self.max_edge_bright = le
+            self.light.append(brightness)
+            self.ratio.append(lc / (le + 0.1))
+            if (fl["sequential"] and len(self.light) >= fl["min_samples"] and
+                    now - start - fl["light_settle"] >= fl["min_light"]):
+                result = self.sequential(face["glare"])
+                if result is not None: return result, (self.dark.trimmed_mean(), self.light.trimmed_mean())
+        if timeout: return self.evaluate(face["glare"]), (self.min_dark_val, self.max_light_val)
+        return None
+
+    def finish(self, result, face, now):
+        passed, fail_reason, diff, ratio_3d = result
+        self.in_flash = False
+        event = {
+            "ts": now,
+            "user": self.user,
+            "passed": passed,
+            "reason": fail_reason,
+            "diff": diff,
+            "ratio_3d": ratio_3d,
+            "glare": bool(face["glare"]),
+            "attempt": self.flash_attempts + 1,
+            "track": self.track.id,
+            "latency": self.engine.latency,
+            "elapsed": now - self.attempt_start,
+            "final": True
+        }
+        attempts = self.engine.attempts
+        if passed:
+            self.sec_state = "ok"
+            self.last_check_time = now
+            attempts.pop(self.user, None)
+        else:
+            self.flash_attempts += 1
+            attempts[self.user] = self.flash_attempts
+            if self.flash_attempts >= self.thresholds["max_flash_attempts"]:
+                self.sec_state = "fail"
+                self.fail_time = now
+                self.engine.fail_times[self.user] = now
+                attempts.pop(self.user, None)
+            else:
+                event["final"] = False
+        return event
+
+class LivenessEngine:
+    def __init__(self, thresholds=THRESHOLDS, track_settings=TRACK_SETTINGS, flash_settings=FLASH_SETTINGS, display_marks=False):
+        self.thresholds = thresholds
+        # True - экран отмечает показ фаз (mark_displayed), иначе фаза считается от запроса вспышки
+        self.display_marks = display_marks
+        self.flash = flash_settings
+        self.latency = flash_settings["latency"]
+        self.tracker = FaceTracker(track_settings)
+        self.reset()
+
+    def reset(self):
+        self.sessions = {}
+        self.attempts = {}
+        self.fail_times = {}
+        self.current = []
+        self.flash_state = 0
+        self.flash_timer = 0
+        self.shown = {}
+        self.tracker.reset()
+
+    @property
+    def track(self):
+        return self.tracker.track
+
+    @property
+    def session(self):
+        track = self.tracker.track
+        return self.sessions.get(track.id) if track is not None else None
+
+    @property
+    def sec_state(self):
+        s = self.session
+        return s.sec_state if s is not None else "scan"
+
+    @property
+    def user(self):
+        s = self.session
+        return s.user if s is not None else ""
+
+    def participants(self):
+        return [s for s in self.sessions.values() if s.in_flash]
+
+    def start_flash(self, now):
+        self.flash_state = 1
+        self.flash_timer = now
+        self.shown = {}
+        for s in self.sessions.values():
+            if s.sec_state == "flash_check":
+                s.in_flash = True
+                s.start_attempt(now)
+
+    def mark_displayed(self, state, ts):
+        if state and state == self.flash_state and state not in self.shown:
+            self.shown[state] = ts
+            for s in self.participants(): s.clear_phase(state)
+
+    def phase_start(self, state):
+        # кадр учитывается, только если вся экспозиция после смены экрана
+        if state in self.shown: return self.shown[state] + self.latency + self.flash["exposure"]
+        # отметки еще нет: кадры со старого экрана не должны закрыть фазу досрочно
+        if self.display_marks: return self.flash_timer + self.flash["max_latency"]
+        return self.flash_timer
+
+    def calibrate(self, session, dark, light):
+        if 2 not in self.shown or not session.light_samples: return
+        diff = light - dark
+        if diff < session.current_thresholds["min_flash_diff"]: return
+        mid = dark + diff / 2
+        hit = next((ts for ts, b in session.light_samples if b >= mid), None)
+        if hit is None: return
+        observed = min(max(hit - self.shown[2] - self.flash["exposure"], 0.0), self.flash["max_latency"])
+        a = self.flash["latency_alpha"]
+        self.latency = (1 - a) * self.latency + a * observed
+
+    def step(self, res, now, identify):
+        events = self.step_faces([res] if res["detected"] else [], now, lambda tracks: [identify()])
+        return events[0] if events else None
+
+    def step_faces(self, faces, now, identify):
+        # лицо может пропасть в темной фазе дольше max_gap - трек живет до конца вспышки
+        tracks = self.tracker.update_faces(faces, now, {s.track.id for s in self.participants()})
+        alive = {t.id for t in self.tracker.tracks}
+        for tid in [tid for tid in self.sessions if tid not in alive]: del self.sessions[tid]
+        self.current = []
+        for track, face in zip(tracks, faces):
+            if track.id not in self.sessions: self.sessions[track.id] = FaceSession(self, track)
+            self.current.append((face, self.sessions[track.id]))
+        events = []
+        scanning = [(face, s) for face, s in self.current if s.sec_state == "scan"]
+
+        # одна вспышка на всех: каждое лицо в цикле измеряется по общим фазам
+        if self.flash_state:
+            fl = self.flash
+            measured = [(face, s) for face, s in self.current if s.in_flash]
+            if self.flash_state == 1:
+                for face, s in measured:
+                    out = s.measure_dark(face, now)
+                    if out is not None:
+                        self.calibrate(s, *out[1])
+                        events.append(s.finish(out[0], face, now))
+                parts = self.participants()
+                start = self.phase_start(1)
+                if parts and (now - start > fl["dark_duration"] or
+                              (fl["sequential"] and now >= start and all(s.dark_settled(now - start) for s in parts))):
+                    self.flash_state = 2
+                    self.flash_timer = now
+                    for s in parts: s.max_center_bright = s.max_edge_bright = 0.0
+            else:
+                timeout = now - self.phase_start(2) > fl["light_duration"]
+                for face, s in measured:
+                    out = s.measure_light(face, now, timeout)
+                    if out is not None:
+                        self.calibrate(s, *out[1])
+                        events.append(s.finish(out[0], face, now))
+                if timeout:
+                    # лицо не вернулось к концу вспышки - попытка прерывается без счета
+                    for s in self.participants():
+                        s.in_flash = False
+                        s.sec_state = "scan"
+            if not self.participants(): self.flash_state = 0
+
+        for face, s in self.current:
+            if s.sec_state == "ok":
+                limits, age = self.tracker.settings, now - s.last_check_time
+                if age > limits["max_session"] or 0 < limits["reauth_interval"] < age: s.sec_state = "scan"
+            elif s.sec_state == "fail":
+                if now - s.fail_time > self.tracker.settings["lockout"]: s.sec_state = "scan"
+
+        if scanning:
+            names = self.tracker.identify_faces([s.track for _, s in scanning], identify, now)
+            for (face, s), (name, conf) in zip(scanning, names):
+                if name != "Unknown" and conf > 50: s.begin(name, face["brightness"], now)
+
+        # новые лица и повторные попытки ждут следующего цикла
+        if not self.flash_state and any(s.sec_state == "flash_check" for s in self.sessions.values()):
+            self.start_flash(now)
+        return events
@@ -0,0 +1,87 @@
+import time
+import cv2
+import numpy as np
+from config import ENROLL_SETTINGS
+
+class SampleSelector:
+    NEUTRAL_PITCH = 0.12
+
+    def __init__(self, settings=ENROLL_SETTINGS):
+        self.settings = settings
+        self.reset()
+
+    def reset(self):
+        self.samples = []
+        self.thumbs = []
+        self.bins = {}
+        self.started = time.time()
+        self.rejected = 0
+        self.last_reason = ""
+
+    @property
+    def target(self):
+        return self.settings["target_samples"]
+
+    @property
+    def done(self):
+        if len(self.samples) >= self.target: return True
+        timed_out = time.time() - self.started > self.settings["max_duration"]
+        return timed_out and len(self.samples) >= self.settings["min_samples"]
+
+    @staticmethod
+    def head_pose(landmarks):
+        pts = np.asarray(landmarks, dtype=np.float32)
+        nose, left, right, top, chin = pts[1], pts[234], pts[454], pts[10], pts[152]
+        half_w = max(abs(right[0] - left[0]) / 2, 1.0)
+        half_h = max(abs(chin[1] - top[1]) / 2, 1.0)
+        yaw = (nose[0] - (left[0] + right[0]) / 2) / half_w
+        pitch = (nose[1] - (top[1] + chin[1]) / 2) / half_h - SampleSelector.NEUTRAL_PITCH
+        return float(yaw), float(pitch)
+
+    @staticmethod
+    def thumbnail(face):
+        thumb = cv2.resize(face, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+        return (thumb - thumb.mean()) / (thumb.std() + 1e-6)
+
+    def score(self, face, landmarks):
+        s = self.settings
+        sharpness = cv2.Laplacian(face, cv2.CV_64F).var()
+        exposure = float(face.mean())
+        clipped = np.count_nonzero((face < 5) | (face > 250)) / face.size
+        yaw, pitch = self.head_pose(landmarks) if landmarks is not None else (0.0, 0.0)
+
+        reason = ""
+        if sharpness < s["min_sharpness"]: reason = "blurry"
+        elif not s["min_exposure"] <= exposure <= s["max_exposure"]: reason = "exposure"
+        elif clipped > s["max_clipped"]: reason = "exposure"
+        elif abs(yaw) > s["max_yaw"] or abs(pitch) > s["max_pitch"]: reason = "pose"
+        return {"sharpness": sharpness, "exposure": exposure, "clipped": clipped,
+                "yaw": yaw, "pitch": pitch, "reason": reason}
+
+    def pose_bin(self, yaw, pitch):
+        ty, tp = self.settings["max_yaw"] / 3, self.settings["max_pitch"] / 3
+        by = 0 if yaw < -ty else (2 if yaw > ty else 1)
+        bp = 0 if pitch < -tp else (2 if pitch > tp else 1)
+        return by, bp
+
+    def offer(self, face, landmarks):
+        if self.done: return False, "done"
+        q = self.score(face, landmarks)
+        reason = q["reason"]
+        if not reason:
+            b = self.pose_bin(q["yaw"], q["pitch"])
+            thumb = self.thumbnail(face)
+            if self.bins.get(b, 0) >= self.settings["per_pose_bin"]:
+                reason = "turn head"
+            elif self.thumbs and min(np.abs(thumb - t).mean() for t in self.thumbs) < self.settings["min_difference"]:
+                reason = "duplicate"
+        if reason:
+            self.rejected += 1
+            self.last_reason = reason
+            return False, reason
+
+        self.samples.append(face)
+        self.thumbs.append(thumb)
+        self.bins[b] = self.bins.get(b, 0) + 1
+        self.last_reason = ""
+        return True, ""
@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import argparse
+import multiprocessing as mp
+from collections import Counter
+import cv2
+import numpy as np
+from config import THRESHOLDS
+from engine import LivenessEngine
+from lpad_core import FaceProcessor
+
+GENUINE_LABELS = {"genuine", "live", "bonafide", "bona_fide", "real"}
+VIDEO_EXT = {".mp4", ".avi", ".mkv", ".mov"}
+IMAGE_EXT = {".jpg", ".jpeg", ".png", ".bmp"}
+
+def find_sessions(roots):
+    sessions = []
+    for root in roots:
+        for label in sorted(os.listdir(root)):
+            label_dir = os.path.join(root, label)
+            if not os.path.isdir(label_dir): continue
+            for name in sorted(os.listdir(label_dir)):
+                path = os.path.join(label_dir, name)
+                if os.path.isdir(path) or os.path.splitext(name)[1].lower() in VIDEO_EXT:
+                    sessions.append({"path": path, "label": label.lower(),
+                                     "genuine": label.lower() in GENUINE_LABELS})
+    return sessions
+
+def read_frames(path, fps):
+    if os.path.isdir(path):
+        files = sorted(f for f in os.listdir(path) if os.path.splitext(f)[1].lower() in IMAGE_EXT)
+        stamps = None
+        ts_file = os.path.join(path, "timestamps.txt")
+        if os.path.exists(ts_file):
+            with open(ts_file) as f:
+                stamps = [float(line) for line in f if line.strip()]
+        for i, name in enumerate(files):
+            frame = cv2.imread(os.path.join(path, name))
+            if frame is None: continue
+            ts = stamps[i] if stamps and i < len(stamps) else i / fps
+            yield frame, ts
+    else:
+        cap = cv2.VideoCapture(path)
+        i = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret: break
+            pos = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            yield frame, (pos if pos > 0 else i / fps)
+            i += 1
+        cap.release()
+
+_worker = {}
+
+def init_worker(opts):
+    _worker["opts"] = opts
+    _worker["id_sys"] = None
+    if opts["recognize"]:
+        from face_id import FaceIDSystem
+        _worker["id_sys"] = FaceIDSystem()
+
+def run_session(session):
+    opts = _worker["opts"]
+    id_sys = _worker["id_sys"]
+    thresholds = THRESHOLDS.copy()
+    thresholds.update(opts["thresholds"])
+    proc = FaceProcessor(use_gate=False)
+    engine = LivenessEngine(thresholds)
+    result = dict(session, decision="none", reason="", attempts=[], time_to_decision=None, frames=0)
+    start = None
+    for frame, ts in read_frames(session["path"], opts["fps"]):
+        if opts["flip"]: frame = cv2.flip(frame, 1)
+        if start is None: start = ts
+        result["frames"] += 1
+        res = proc.process(frame)
+        if id_sys is not None:
+            identify = lambda: id_sys.recognize(frame, res["bbox"])
+        else:
+            identify = lambda: ("subject", 100)
+        event = engine.step(res, ts, identify)
+        if event is None: continue
+        result["attempts"].append({k: event[k] for k in ("attempt", "passed", "reason", "diff", "ratio_3d", "glare")})
+        if event["final"]:
+            result["decision"] = "ok" if event["passed"] else "fail"
+            result["reason"] = event["reason"]
+            result["time_to_decision"] = ts - start
+            break
+    return result
+
+def summarize(results):
+    genuine = [r for r in results if r["genuine"]]
+    attacks = [r for r in results if not r["genuine"]]
+    report = {
+        "sessions": len(results),
+        "genuine": len(genuine),
+        "attacks": len(attacks),
+        "bpcer": None,
+        "apcer": None,
+        "apcer_by_type": {},
+        "no_decision": sum(1 for r in results if r["decision"] == "none"),
+        "fail_reasons": {"genuine": {}, "attack": {}},
+        "attempt_fail_reasons": {"genuine": {}, "attack": {}},
+        "time_to_decision": {}
+    }
+    if genuine:
+        report["bpcer"] = sum(1 for r in genuine if r["decision"] != "ok") / len(genuine)
+    if attacks:
+        report["apcer"] = sum(1 for r in attacks if r["decision"] == "ok") / len(attacks)
+        for label in sorted({r["label"] for r in attacks}):
+            group = [r for r in attacks if r["label"] == label]
+            report["apcer_by_type"][label] = sum(1 for r in group if r["decision"] == "ok") / len(group)
+    for key, group in (("genuine", genuine), ("attack", attacks)):
+        report["fail_reasons"][key] = dict(Counter(r["reason"] for r in group if r["decision"] == "fail"))
+        report["attempt_fail_reasons"][key] = dict(Counter(a["reason"] for r in group for a in r["attempts"] if not a["passed"]))
+        times = [r["time_to_decision"] for r in group if r["time_to_decision"] is not None]
+        if times:
+            report["time_to_decision"][key] = {
+                "mean": float(np.mean(times)),
+                "p50": float(np.percentile(times, 50)),
+                "p95": float(np.percentile(times, 95))
+            }
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline L-PAD liveness evaluation on recorded sessions. "
+                                     "Each root contains label folders (genuine/, print/, screen/, ...) "
+                                     "with video files or frame folders (optional timestamps.txt).")
+    parser.add_argument("roots", nargs="+")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--fps", type=float, default=30.0, help="timestamps for sessions without them")
+    parser.add_argument("--recognize", action="store_true", help="use the trained FaceID model instead of accepting any face")
+    parser.add_argument("--flip", action="store_true", help="mirror frames like the live app")
+    parser.add_argument("--thresholds", default="{}", help="JSON with THRESHOLDS overrides")
+    parser.add_argument("--out", help="write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    sessions = find_sessions(args.roots)
+    if not sessions:
+        print("[ERR] Сессии не найдены!")
+        return 1
+    opts = {"fps": args.fps, "recognize": args.recognize, "flip": args.flip,
+            "thresholds": json.loads(args.thresholds)}
+
+    print(f"[INFO] Сессий: {len(sessions)}, процессов: {args.workers}")
+    with mp.Pool(args.workers, initializer=init_worker, initargs=(opts,)) as pool:
+        results = []
+        for r in pool.imap_unordered(run_session, sessions):
+            results.append(r)
+            print(f"  {r['label']:<10} {r['decision']:<5} {r['reason']:<15} {os.path.basename(r['path'])}")
+
+    report = summarize(results)
+    fmt = lambda v: "n/a" if v is None else f"{v * 100:.2f}%"
+    print(f"[OK] APCER={fmt(report['apcer'])} BPCER={fmt(report['bpcer'])} "
+          f"без решения: {report['no_decision']}")
+    for label, v in report["apcer_by_type"].items():
+        print(f"     APCER[{label}]={fmt(v)}")
+    for key, reasons in report["fail_reasons"].items():
+        if reasons: print(f"     {key}: {reasons}")
+    if args.out:
+        report["results"] = sorted(results, key=lambda r: r["path"])
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,100 +1,410 @@
 import cv2
 import os
+import json
+import threading
 import numpy as np
 import shutil
-from config import USERS_DIR, MODEL_FILE
+from config import USERS_DIR, MODEL_FILE, RECOGNITION
+from stats import STATS
+
+class LBPHBackend:
+    MAGIC = b"LPADLBPH"
+    ALIGN = 64
+    CHUNK = 128
+    FACES_CHUNK = 64
+
+    def __init__(self, model_file, lock=None):
+        # YAML OpenCV остается как есть, рядом - бинарные версии base.000001.lbph, ...
+        self.model_file = model_file
+        self.store_base = os.path.splitext(model_file)[0]
+        self.store_file = None
+        # тот же lock, что у FaceIDSystem: под ним идет распознавание
+        self.lock = lock or threading.Lock()
+        self.params = {"radius": 1, "neighbors": 8, "grid_x": 8, "grid_y": 8, "threshold": float(np.finfo(np.float64).max)}
+        self.clear()
+
+    @property
+    def trained(self):
+        return len(self.labels) > 0
+
+    def clear(self):
+        self.hists = np.zeros((0, 0), dtype=np.float32)
+        self.labels = np.zeros(0, dtype=np.int32)
+
+    def histograms(self, faces):
+        # пачками по FACES_CHUNK: временные массивы elbp ~1 МБ на лицо
+        p = self.params
+        out = np.empty((len(faces), 2 ** p["neighbors"] * p["grid_x"] * p["grid_y"]), dtype=np.float32)
+        for lo in range(0, len(faces), self.FACES_CHUNK):
+            out[lo:lo + self.FACES_CHUNK] = self.chunk_histograms(faces[lo:lo + self.FACES_CHUNK])
+        return out
+
+    def chunk_histograms(self, faces):
+        # то же, что LBPH в OpenCV (elbp + spatial_histogram), сразу для пачки лиц 200x200
+        p = self.params
+        r, n, gx, gy = p["radius"], p["neighbors"], p["grid_x"], p["grid_y"]
+        imgs = np.stack([np.asarray(f) for f in faces]).astype(np.float32)
+        b, h, w = imgs.shape
+        center = imgs[:, r:h - r, r:w - r]
+        code = np.zeros(center.shape, dtype=np.int64)
+        one, eps = np.float32(1), np.finfo(np.float32).eps
+        for k in range(n):
+            x = np.float32(r * np.cos(2.0 * np.pi * k / np.float32(n)))
+            y = np.float32(-r * np.sin(2.0 * np.pi * k / np.float32(n)))
+            fx, fy, cx, cy = int(np.floor(x)), int(np.floor(y)), int(np.ceil(x)), int(np.ceil(y))
+            tx, ty = x - np.float32(fx), y - np.float32(fy)
+            at = lambda dy, dx: imgs[:, r + dy:h - r + dy, r + dx:w - r + dx]
+            t = ((one - tx) * (one - ty) * at(fy, fx) + tx * (one - ty) * at(fy, cx) +
+                 (one - tx) * ty * at(cy, fx) + tx * ty * at(cy, cx))
+            code |= ((t > center) | (np.abs(t - center) < eps)).astype(np.int64) << k
+        bins, cells = 2 ** n, gx * gy
+        ch, cw = code.shape[1] // gy, code.shape[2] // gx
+        code = code[:, :ch * gy, :cw * gx].reshape(b, gy, ch, gx, cw).transpose(0, 1, 3, 2, 4).reshape(b, cells, ch * cw)
+        code += (np.arange(b * cells) * bins).reshape(b, cells, 1)
+        hist = np.bincount(code.ravel(), minlength=b * cells * bins).astype(np.float32).reshape(b, -1)
+        return (hist * (1.0 / (ch * cw))).astype(np.float32)
+
+    def store_files(self):
+        folder = os.path.dirname(self.store_base) or "."
+        prefix = os.path.basename(self.store_base) + "."
+        found = []
+        if not os.path.isdir(folder): return found
+        for name in os.listdir(folder):
+            version = name[len(prefix):-len(".lbph")]
+            if name.startswith(prefix) and name.endswith(".lbph") and version.isdigit():
+                found.append((int(version), os.path.join(folder, name)))
+        return sorted(found)
+
+    def load(self):
+        self.clear()
+        try:
+            files = self.store_files()
+            # YAML новее последней версии (подложен вручную) - импортируем заново
+            if os.path.exists(self.model_file) and (not files or os.path.getmtime(self.model_file) > os.path.getmtime(files[-1][1])):
+                self.import_yaml()
+            elif files: self.read_store(files[-1][1])
+        except Exception as e:
+            print(f"[ERR] Не удалось загрузить модель: {e}")
+            self.clear()
+
+    def open_store(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC: raise ValueError("bad model file")
+            size = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+            header = json.loads(f.read(size).decode("utf-8"))
+        count, dim = header["count"], header["dim"]
+        if not count: return header["params"], np.zeros(0, dtype=np.int32), np.zeros((0, 0), dtype=np.float32)
+        labels = np.memmap(path, dtype="<i4", mode="r", offset=header["labels_offset"], shape=(count,))
+        hists = np.memmap(path, dtype="<f4", mode="r", offset=header["hists_offset"], shape=(count, dim))
+        return header["params"], labels, hists
+
+    def read_store(self, path):
+        # новые memmap собираются заранее и подменяются под lock, чтобы распознавание не видело пустую модель
+        params, labels, hists = self.open_store(path)
+        with self.lock:
+            self.params.update(params)
+            self.labels, self.hists = labels, hists
+            self.store_file = path
+
+    def import_yaml(self):
+        rec = cv2.face.LBPHFaceRecognizer_create()
+        rec.read(self.model_file)
+        self.params = {"radius": rec.getRadius(), "neighbors": rec.getNeighbors(), "grid_x": rec.getGridX(),
+                       "grid_y": rec.getGridY(), "threshold": float(rec.getThreshold())}
+        hists = rec.getHistograms()
+        if hists:
+            self.hists = np.vstack(hists).astype(np.float32)
+            self.labels = rec.getLabels().ravel().astype(np.int32)
+        print(f"[INFO] Модель {self.model_file} загружена, бинарная копия рядом")
+        self.save()
+
+    def save(self):
+        # пустая модель тоже пишется: иначе при следующей загрузке вернулся бы старый YAML
+        count, dim = self.hists.shape if self.trained else (0, 0)
+        pad = lambda n: -n % self.ALIGN
+        header = {"version": 1, "params": self.params, "count": count, "dim": dim}
+        # смещения зависят от длины заголовка: считаем с запасом под числа
+        base = len(self.MAGIC) + 4 + len(json.dumps(dict(header, labels_offset=0, hists_offset=0)).encode()) + 40
+        header["labels_offset"] = base + pad(base)
+        end = header["labels_offset"] + 4 * count
+        header["hists_offset"] = end + pad(end)
+        raw = json.dumps(header).encode("utf-8")
+
+        # новая версия под новым именем: старый файл может быть открыт (memmap) в других процессах,
+        # а Windows не дает заменить или удалить такой файл
+        files = self.store_files()
+        path = f"{self.store_base}.{(files[-1][0] if files else 0) + 1:06d}.lbph"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.MAGIC)
+            f.write(np.uint32(len(raw)).astype("<u4").tobytes())
+            f.write(raw)
+            f.write(b"\0" * (header["labels_offset"] - f.tell()))
+            if count:
+                f.write(np.ascontiguousarray(self.labels, dtype="<i4").tobytes())
+                f.write(b"\0" * (header["hists_offset"] - f.tell()))
+                f.write(np.ascontiguousarray(self.hists, dtype="<f4").tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self.read_store(path)
+        for _, old in files:
+            try: os.remove(old)
+            except OSError: pass
+
+    def train(self, faces, ids):
+        self.hists = self.histograms(faces)
+        self.labels = np.asarray(ids, dtype=np.int32)
+
+    def add(self, faces, ids):
+        if not self.trained: return self.train(faces, ids)
+        self.hists = np.concatenate((self.hists, self.histograms(faces)))
+        self.labels = np.concatenate((self.labels, np.asarray(ids, dtype=np.int32)))
+
+    def remove(self, label):
+        keep = self.labels != label
+        if keep.all(): return
+        self.hists = self.hists[keep]
+        self.labels = self.labels[keep]
+
+    def distances(self, queries, hists):
+        # chi-square (HISTCMP_CHISQR_ALT): 2 * sum((h - q)^2 / (h + q)), блоками по memmap
+        out = np.empty((len(queries), len(hists)))
+        buf = np.empty((self.CHUNK, hists.shape[1]), dtype=np.float32)
+        den = np.empty_like(buf)
+        for lo in range(0, len(hists), self.CHUNK):
+            h = hists[lo:lo + self.CHUNK]
+            a, b = buf[:len(h)], den[:len(h)]
+            for i, q in enumerate(queries):
+                np.subtract(h, q, out=a)
+                np.add(h, q, out=b)
+                b += np.float32(1e-30)
+                np.multiply(a, a, out=a)
+                np.divide(a, b, out=a)
+                out[i, lo:lo + len(h)] = 2.0 * a.sum(axis=1, dtype=np.float64)
+        return out
+
+    def predict_batch(self, faces):
+        # один снимок модели на весь вызов: save() может подменить массивы
+        hists, labels, threshold = self.hists, self.labels, self.params["threshold"]
+        if not len(labels): return [(-1, 0) for _ in faces]
+        results = []
+        for dist in self.distances(self.histograms(faces), hists):
+            i = int(np.argmin(dist))
+            if dist[i] >= threshold: results.append((-1, 0))
+            else: results.append((int(labels[i]), max(0, 100 - dist[i])))
+        return results
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
 
 class FaceIDSystem:
-    def __init__(self):
-        self.rec = cv2.face.LBPHFaceRecognizer_create()
-        self.trained = False
+    def __init__(self, users_dir=USERS_DIR, model_file=MODEL_FILE, backend=None):
+        self.users_dir = users_dir
+        self.model_file = model_file
+        self.labels_file = os.path.splitext(model_file)[0] + "_labels.json"
+        self.lock = threading.Lock()
+        self.backend = self.create_backend(backend or RECOGNITION["backend"])
+        self.busy = False
+        self.last_result = None
         self.names = {}
+        self.labels = {}
+        self.next_id = 0
         self.load()
 
+    def create_backend(self, kind):
+        if kind == "embedding":
+            try:
+                from embedding import EmbeddingBackend
+                return EmbeddingBackend(os.path.splitext(self.model_file)[0] + "_gallery.npz")
+            except Exception as e:
+                print(f"[ERR] Embedding backend недоступен ({e}), используется LBPH.")
+        return LBPHBackend(self.model_file, self.lock)
+
+    @property
+    def trained(self):
+        return self.backend.trained
+
     def load(self):
-        if os.path.exists(MODEL_FILE):
+        self.load_labels()
+        self.backend.load()
+
+    def load_labels(self):
+        self.labels = {}
+        if os.path.exists(self.labels_file):
             try:
-                self.rec.read(MODEL_FILE)
-                self.update_names()
-                self.trained = True
-            except: pass
+                with open(self.labels_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.labels = {name: int(i) for name, i in data["users"].items()}
+                self.next_id = int(data.get("next_id", 0))
+            except: self.labels = {}
+        elif os.path.exists(self.model_file) and os.path.exists(self.users_dir):
+            # Старые модели: метки = порядковый номер папки
+            self.labels = {name: i for i, name in enumerate(sorted(os.listdir(self.users_dir)))}
+            self.save_labels()
+        self.next_id = max([self.next_id] + [i + 1 for i in self.labels.values()])
+        self.update_names()
+
+    def save_labels(self):
+        os.makedirs(os.path.dirname(self.labels_file) or ".", exist_ok=True)
+        tmp = self.labels_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"next_id": self.next_id, "users": self.labels}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.labels_file)
 
     def update_names(self):
-        self.names = {}
-        if not os.path.exists(USERS_DIR): return
-        for i, name in enumerate(sorted(os.listdir(USERS_DIR))):
-            self.names[i] = name
+        self.names = {i: name for name, i in self.labels.items()}
 
-    def save_sample(self, frame, bbox, name, count):
-        if bbox is None: return False
+    @staticmethod
+    def face_crop(frame, bbox):
+        if bbox is None: return None
         x1, y1, x2, y2 = bbox
-        w, h = x2 - x1, y2 - y1
-        
+        face = frame[y1:y2, x1:x2]
+        if face.size == 0: return None
+        gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (200, 200))
+
+    def save_sample(self, frame, bbox, name, count):
         try:
-            face = frame[y1:y2, x1:x2]
-            if face.size == 0: return False
-            gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-            gray = cv2.resize(gray, (200, 200))
-            
-            path = os.path.join(USERS_DIR, name)
+            gray = self.face_crop(frame, bbox)
+            if gray is None: return False
+
+            path = os.path.join(self.users_dir, name)
             os.makedirs(path, exist_ok=True)
             cv2.imwrite(f"{path}/{count}.jpg", gray)
             return True
         except: return False
 
+    def save_samples(self, name, faces):
+        path = os.path.join(self.users_dir, name)
+        try:
+            if os.path.exists(path): shutil.rmtree(path)
+            os.makedirs(path, exist_ok=True)
+            for count, gray in enumerate(faces):
+                cv2.imwrite(f"{path}/{count}.jpg", gray)
+            return True
+        except Exception as e:
+            print(f"[ERR] Ошибка сохранения: {e}")
+            return False
+
+    def load_samples(self, name):
+        faces = []
+        path = os.path.join(self.users_dir, name)
+        if not os.path.isdir(path): return faces
+        for file in os.listdir(path):
+            try:
+                img = cv2.imread(os.path.join(path, file), cv2.IMREAD_GRAYSCALE)
+                if img is not None: faces.append(img)
+            except: pass
+        return faces
+
+    def run_async(self, fn, *args):
+        if self.busy: return False
+        self.busy = True
+        def worker():
+            try: self.last_result = fn(*args)
+            except Exception as e:
+                print(f"[ERR] {e}")
+                self.last_result = False
+            finally: self.busy = False
+        threading.Thread(target=worker, daemon=True).start()
+        return True
+
     def train(self):
         print("\n[INFO] Обучение модели...")
         faces, ids = [], []
-        
-        if not os.path.exists(USERS_DIR): return
-        
-        for i, name in enumerate(sorted(os.listdir(USERS_DIR))):
-            path = os.path.join(USERS_DIR, name)
-            for file in os.listdir(path):
-                try:
-                    img = cv2.imread(os.path.join(path, file), cv2.IMREAD_GRAYSCALE)
-                    if img is not None:
-                        faces.append(img)
-                        ids.append(i)
-                except: pass
-        
+
+        if not os.path.exists(self.users_dir): return
+
+        names = sorted(os.listdir(self.users_dir))
+        labels = {}
+        for name in names:
+            labels[name] = self.labels.get(name)
+            if labels[name] is None:
+                labels[name] = self.next_id
+                self.next_id += 1
+            for img in self.load_samples(name):
+                faces.append(img)
+                ids.append(labels[name])
+
         if faces:
-            self.rec.train(faces, np.array(ids))
-            self.rec.write(MODEL_FILE)
-            self.update_names()
-            self.trained = True
+            with self.lock:
+                self.backend.train(faces, ids)
+                self.labels = labels
+                self.update_names()
+            self.save_labels()
+            self.backend.save()
             print(f"[OK] Модель обучена. Пользователей: {len(self.names)}")
         else:
             print("[ERR] Нет данных для обучения!")
 
+    def enroll(self, name, faces=None):
+        print(f"\n[INFO] Добавление {name} в модель...")
+        if faces is None: faces = self.load_samples(name)
+        elif not self.save_samples(name, faces): return False
+        if not faces:
+            print("[ERR] Нет данных для обучения!")
+            return False
+
+        with self.lock:
+            if name in self.labels:
+                label = self.labels[name]
+                self.backend.remove(label)
+            else:
+                label = self.next_id
+                self.next_id += 1
+            self.backend.add(faces, np.full(len(faces), label, dtype=np.int32))
+            self.labels[name] = label
+            self.update_names()
+        self.save_labels()
+        self.backend.save()
+        print(f"[OK] Модель обновлена. Пользователей: {len(self.names)}")
+        return True
+
     def delete_user(self, name):
-        path = os.path.join(USERS_DIR, name)
+        path = os.path.join(self.users_dir, name)
         if os.path.exists(path):
             try:
                 shutil.rmtree(path)
                 print(f"[OK] Папка {name} удалена.")
-                self.train()
+                if name in self.labels:
+                    with self.lock:
+                        self.backend.remove(self.labels.pop(name))
+                        self.update_names()
+                    self.save_labels()
+                    self.backend.save()
                 return True
             except Exception as e:
                 print(f"[ERR] Ошибка удаления: {e}")
         return False
 
+    def recognize_batch(self, frame, bboxes):
+        if not bboxes or not self.trained: return [("Unknown", 0)] * len(bboxes)
+        try: crops = [self.face_crop(frame, bbox) for bbox in bboxes]
+        except: return [("Error", 0)] * len(bboxes)
+        return self.recognize_crops(crops)
+
+    def recognize_crops(self, crops):
+        results = [("Unknown", 0)] * len(crops)
+        if not crops or not self.trained: return results
+
+        try:
+            t0 = STATS.clock()
+            idx = [i for i, face in enumerate(crops) if face is not None]
+            if not idx: return results
+
+            if not self.lock.acquire(blocking=False): return results
+            try: preds = self.backend.predict_batch([crops[i] for i in idx])
+            finally: self.lock.release()
+
+            for i, (id_, score) in zip(idx, preds):
+                results[i] = (self.names.get(id_, "Unknown"), score)
+            STATS.stop("recognize", t0)
+            return results
+
+        except: return [("Error", 0)] * len(crops)
+
     def recognize(self, frame, bbox):
         if bbox is None: return "Unknown", 0
-        if not self.trained: return "Unknown", 0
-        
-        x1, y1, x2, y2 = bbox
-        w, h = x2 - x1, y2 - y1
-        
-        try:
-            face = frame[y1:y2, x1:x2]
-            gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-            gray = cv2.resize(gray, (200, 200))
-            
-            id_, conf = self.rec.predict(gray)
-            score = max(0, 100 - conf)
-            
-            name = self.names.get(id_, "Unknown")
-            return name, score
-
-        except: return "Error", 0
+        return self.recognize_batch(frame, [bbox])[0]
@@ -1,46 +1,149 @@
 import os
 import cv2
+import numpy as np
 import mediapipe as mp
-from config import THRESHOLDS
+from config import THRESHOLDS, MESH_SETTINGS
 from anti_spoofing import LivenessDetector
+from detector import FaceGate
+from stats import STATS
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
 class FaceProcessor:
-    def __init__(self):
-        self.face_mesh = mp.solutions.face_mesh.FaceMesh(
-            max_num_faces=1,
+    LANDMARK_DTYPE = np.dtype([("tag", "u1"), ("size", "u1"),
+                               ("kx", "u1"), ("x", "<f4"),
+                               ("ky", "u1"), ("y", "<f4"),
+                               ("kz", "u1"), ("z", "<f4")])
+
+    def __init__(self, use_gate=True):
+        self.settings = MESH_SETTINGS.copy()
+        self.face_mesh = self.create_mesh(max_faces=self.settings["max_faces"])
+        self.gate = FaceGate() if use_gate else None
+        self.search_mesh = None
+        self.roi = None
+        self.roi_size = 0
+
+    @staticmethod
+    def create_mesh(static=False, max_faces=1):
+        return mp.solutions.face_mesh.FaceMesh(
+            static_image_mode=static,
+            max_num_faces=max_faces,
             refine_landmarks=True,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
 
+    @staticmethod
+    def landmarks_to_array(mesh, w, h):
+        n = len(mesh.landmark)
+        raw = mesh.SerializeToString()
+        rec = None
+        # быстрый разбор только для известной сетки (468/478 точек) и раскладки полей x, y, z
+        if n in (468, 478) and len(raw) == n * FaceProcessor.LANDMARK_DTYPE.itemsize:
+            rec = np.frombuffer(raw, dtype=FaceProcessor.LANDMARK_DTYPE)
+            if not (np.all(rec["tag"] == 0x0A) and np.all(rec["size"] == 15) and
+                    np.all(rec["kx"] == 0x0D) and np.all(rec["ky"] == 0x15)):
+                rec = None
+        if rec is not None:
+            coords = np.stack((rec["x"], rec["y"]), axis=1).astype(np.float64)
+        else:
+            coords = np.fromiter((c for lm in mesh.landmark for c in (lm.x, lm.y)), dtype=np.float64, count=2 * n)
+            coords = coords.reshape(n, 2)
+        coords *= (w, h)
+        return coords.astype(np.int32)
+
+    def run_mesh(self, mesh, frame, roi):
+        x1, y1, x2, y2 = roi
+        crop = frame[y1:y2, x1:x2]
+        ch, cw = crop.shape[:2]
+        if crop.size == 0: return None
+        scale = self.settings["max_side"] / max(cw, ch)
+        if scale < 1.0:
+            crop = cv2.resize(crop, (max(1, int(cw * scale)), max(1, int(ch * scale))), interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        results = mesh.process(rgb)
+        if not results.multi_face_landmarks: return []
+        faces = []
+        for lm in results.multi_face_landmarks:
+            pts = self.landmarks_to_array(lm, cw, ch)
+            pts += (x1, y1)
+            faces.append(pts)
+        return faces
+
+    def update_roi(self, face, w, h):
+        fx1, fy1, fx2, fy2 = face
+        size = max(fx2 - fx1, fy2 - fy1)
+        drift = self.settings["roi_drift"]
+        if self.roi is not None and abs(size - self.roi_size) <= drift * self.roi_size:
+            rx1, ry1, rx2, ry2 = self.roi
+            margin = (self.settings["roi_pad"] - drift) * self.roi_size
+            if ((rx1 == 0 or fx1 - rx1 >= margin) and (ry1 == 0 or fy1 - ry1 >= margin) and
+                    (rx2 == w or rx2 - fx2 >= margin) and (ry2 == h or ry2 - fy2 >= margin)):
+                return
+        pad = int(size * self.settings["roi_pad"])
+        self.roi = (max(0, fx1 - pad), max(0, fy1 - pad), min(w, fx2 + pad), min(h, fy2 + pad))
+        self.roi_size = size
+
     def process(self, frame):
         if frame is None: return {"detected": False}
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb)
+        h, w, _ = frame.shape
         analysis = {
             "detected": False, 
             "bbox": None,
             "glare": False,
             "brightness": 0.0,
             "light_center": 0.0,
-            "light_edge": 0.0
+            "light_edge": 0.0,
+            "landmarks": None,
+            "mesh_roi": None,
+            "gate": None,
+            "faces": []
         }
-        if results.multi_face_landmarks:
-            mesh = results.multi_face_landmarks[0]
-            h, w, _ = frame.shape
-            pts = []
-            for lm in mesh.landmark:
-                pts.append((int(lm.x * w), int(lm.y * h)))
-            xs, ys = [p[0] for p in pts], [p[1] for p in pts]
-            pad = 20
-            bbox = (max(0, min(xs)-pad), max(0, min(ys)-pad), min(w, max(xs)+pad), min(h, max(ys)+pad))
-            analysis["bbox"] = bbox
-            analysis["glare"] = LivenessDetector.check_specular_highlights(frame, bbox)
-            analysis["brightness"] = LivenessDetector.get_face_brightness(frame, bbox)
-            lc, le = LivenessDetector.get_face_light_distribution(frame, pts)
-            analysis["light_center"] = lc
-            analysis["light_edge"] = le
+        if self.gate is not None and self.gate.enabled:
+            t0 = STATS.clock()
+            analysis["gate"] = self.gate.check(frame)
+            STATS.stop("gate", t0)
+            if not analysis["gate"]["run_mesh"]:
+                self.roi = None
+                return analysis
+        faces = []
+        t0 = STATS.clock()
+        # окно вокруг лица имеет смысл только для одного лица
+        tracking = self.settings["tracking"] and self.settings["max_faces"] == 1
+        if not tracking:
+            self.roi = None
+            faces = self.run_mesh(self.face_mesh, frame, (0, 0, w, h))
+            analysis["mesh_roi"] = (0, 0, w, h)
+        else:
+            if self.roi is not None:
+                faces = self.run_mesh(self.face_mesh, frame, self.roi)
+                analysis["mesh_roi"] = self.roi
+            if not faces:
+                if self.search_mesh is None: self.search_mesh = self.create_mesh(static=True)
+                self.roi = None
+                faces = self.run_mesh(self.search_mesh, frame, (0, 0, w, h))
+                analysis["mesh_roi"] = (0, 0, w, h)
+        STATS.stop("mesh", t0)
+
+        pad = 20
+        if faces: t0 = STATS.clock()
+        for pts in faces:
+            x_min, y_min = pts.min(axis=0)
+            x_max, y_max = pts.max(axis=0)
+            bbox = (max(0, int(x_min)-pad), max(0, int(y_min)-pad), min(w, int(x_max)+pad), min(h, int(y_max)+pad))
+            face = {"bbox": bbox, "landmarks": pts}
+            face.update(LivenessDetector.extract_features(frame, bbox, pts))
+            analysis["faces"].append(face)
+        if faces: STATS.stop("features", t0)
+
+        if analysis["faces"]:
+            # основное лицо - самое крупное
+            analysis["faces"].sort(key=lambda f: (f["bbox"][2] - f["bbox"][0]) * (f["bbox"][3] - f["bbox"][1]), reverse=True)
+            main = analysis["faces"][0]
+            if tracking:
+                (x1, y1), (x2, y2) = main["landmarks"].min(axis=0), main["landmarks"].max(axis=0)
+                self.update_roi((int(x1), int(y1), int(x2), int(y2)), w, h)
+            analysis.update(main)
             analysis["detected"] = True
-        return analysis
\ No newline at end of file
+        if self.gate is not None: self.gate.update(analysis["detected"])
+        return analysis
@@ -0,0 +1,196 @@
+import os
+import time
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from config import CAMERA_ID, FRAME_WIDTH, FRAME_HEIGHT, PIPELINE_SETTINGS
+
+def attach_ring(name, slots, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    ring = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=shm.buf)
+    return shm, ring
+
+def capture_main(shm_name, slots, shape, free_q, frame_q, status_q, src, fps, flip, stop, counters):
+    import cv2
+    from camera import CameraStream
+    shm, ring = attach_ring(shm_name, slots, shape)
+    cam = CameraStream(src, shape[1], shape[0], fps=fps)
+    if not cam.open():
+        status_q.put(("error", "камера не открыта"))
+        del ring
+        shm.close()
+        return
+    status_q.put(("ready",))
+    cap = cam.cap
+    seq = 0
+    try:
+        while not stop.is_set():
+            ret, frame = cap.read()
+            ts = time.time()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            counters[0] += 1
+            # нет свободного слота - UI не успевает, кадр отбрасывается
+            try: slot = free_q.get_nowait()
+            except queue.Empty:
+                counters[1] += 1
+                continue
+            dst = ring[slot]
+            if frame.shape != shape:
+                frame = cv2.resize(frame, (shape[1], shape[0]))
+            if flip: cv2.flip(frame, 1, dst=dst)
+            else: dst[:] = frame
+            frame_q.put((slot, seq, ts))
+            seq += 1
+    finally:
+        cap.release()
+        del ring
+        shm.close()
+
+def mesh_main(shm_name, slots, shape, frame_q, result_q, stop, stride):
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+    from lpad_core import FaceProcessor
+    shm, ring = attach_ring(shm_name, slots, shape)
+    proc = FaceProcessor()
+    result_q.put(("ready",))
+    try:
+        while not stop.is_set():
+            item = frame_q.get()
+            if item is None:
+                result_q.put(None)
+                break
+            slot, seq, ts = item
+            # stride задает UI по режиму: 0 - без FaceMesh, N - каждый N-й кадр
+            n = stride.value
+            res = None
+            if n and seq % n == 0:
+                res = proc.process(ring[slot])
+                res.pop("gate", None)
+            result_q.put((slot, seq, ts, res))
+    finally:
+        del ring
+        shm.close()
+
+def recog_main(req_q, resp_q):
+    from face_id import FaceIDSystem
+    id_sys = FaceIDSystem()
+    resp_q.put(("ready",))
+    while True:
+        msg = req_q.get()
+        if msg is None: break
+        if msg[0] == "reload":
+            id_sys.load()
+        elif msg[0] == "recognize":
+            _, ts, items = msg
+            results = id_sys.recognize_crops([face for _, face in items])
+            for (track_id, _), (name, score) in zip(items, results):
+                resp_q.put((track_id, ts, name, float(score)))
+
+class InferencePipeline:
+    def __init__(self, src=CAMERA_ID, width=FRAME_WIDTH, height=FRAME_HEIGHT, settings=PIPELINE_SETTINGS):
+        self.src = src
+        self.shape = (height, width, 3)
+        self.settings = settings
+        self.slots = settings["slots"]
+        self.shm = None
+        self.procs = []
+        self.pending = set()
+        self.last_seq = -1
+        self.processed = 0
+        self.out_of_order = 0
+
+    def start(self, fps=60, flip=True):
+        # spawn: UI-процесс многопоточный (Tk), fork из него небезопасен
+        ctx = mp.get_context("spawn")
+        size = self.slots * int(np.prod(self.shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.ring = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.stop = ctx.Event()
+        self.counters = ctx.Array("q", 2)
+        self.stride = ctx.Value("i", 1, lock=False)
+        self.free_q = ctx.Queue()
+        for i in range(self.slots): self.free_q.put(i)
+        self.frame_q = ctx.Queue()
+        self.result_q = ctx.Queue()
+        self.req_q = ctx.Queue()
+        self.resp_q = ctx.Queue()
+        self.status_q = ctx.Queue()
+        args = (self.shm.name, self.slots, self.shape)
+        self.procs = [
+            ctx.Process(target=mesh_main, args=args + (self.frame_q, self.result_q, self.stop, self.stride), name="LPAD-mesh", daemon=True),
+            ctx.Process(target=recog_main, args=(self.req_q, self.resp_q), name="LPAD-recog", daemon=True),
+            ctx.Process(target=capture_main, args=args + (self.free_q, self.frame_q, self.status_q, self.src, fps, flip, self.stop, self.counters),
+                       name="LPAD-capture", daemon=True)
+        ]
+        try:
+            for p in self.procs[:2]: p.start()
+            # камера стартует после загрузки FaceMesh и модели, чтобы не копить кадры
+            for q in (self.result_q, self.resp_q):
+                if q.get(timeout=self.settings["start_timeout"]) != ("ready",): raise RuntimeError("процесс не запущен")
+            self.procs[2].start()
+            status = self.status_q.get(timeout=self.settings["start_timeout"])
+            if status[0] != "ready": raise RuntimeError(status[1])
+        except Exception:
+            self.release_all()
+            raise
+        return self
+
+    def poll(self, limit=None):
+        items = []
+        while limit is None or len(items) < limit:
+            try: item = self.result_q.get_nowait()
+            except queue.Empty: break
+            if item is None: break
+            slot, seq, ts, res = item
+            if seq <= self.last_seq: self.out_of_order += 1
+            self.last_seq = seq
+            items.append((slot, self.ring[slot], ts, res))
+        self.processed += len(items)
+        return items
+
+    def set_stride(self, stride):
+        self.stride.value = stride
+
+    def release(self, slot):
+        self.free_q.put(slot)
+
+    def recognize(self, items, ts):
+        items = [(tid, face) for tid, face in items if tid not in self.pending]
+        if not items: return
+        self.pending.update(tid for tid, _ in items)
+        self.req_q.put(("recognize", ts, items))
+
+    def identities(self):
+        out = []
+        while True:
+            try: track_id, ts, name, score = self.resp_q.get_nowait()
+            except queue.Empty: break
+            self.pending.discard(track_id)
+            out.append((track_id, ts, name, score))
+        return out
+
+    def reload_model(self):
+        self.req_q.put(("reload",))
+
+    def isOpened(self):
+        return self.shm is not None and all(p.is_alive() for p in self.procs)
+
+    def stats(self):
+        return {"captured": self.counters[0], "dropped": self.counters[1], "processed": self.processed,
+                "out_of_order": self.out_of_order}
+
+    def release_all(self):
+        if self.shm is None: return
+        self.stop.set()
+        self.frame_q.put(None)
+        self.req_q.put(None)
+        for p in self.procs:
+            if p.pid is None: continue
+            p.join(timeout=2.0)
+            if p.is_alive(): p.terminate()
+        del self.ring
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
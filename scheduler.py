@@ -0,0 +1,73 @@
+import time
+from config import SCHEDULER_SETTINGS
+from stats import STATS
+
+class FrameScheduler:
+    def __init__(self, settings=SCHEDULER_SETTINGS):
+        self.settings = settings
+        self.interval = 1 / 30
+        self.last_ts = None
+        self.lag = 0.0
+        self.last_render = 0.0
+        self.skipped = 0
+        self.window_start = time.perf_counter()
+        self.busy = 0.0
+        self.frames = self.meshed = self.rendered = 0
+        self.report = {"duty": 0.0, "fps": 0.0, "mesh_fps": 0.0, "render_fps": 0.0, "stride": 1}
+
+    def on_frame(self, ts, meshed=False):
+        # период кадров камеры по меткам времени захвата
+        if self.last_ts is not None and 0 < ts - self.last_ts < 1.0:
+            self.interval += 0.1 * (ts - self.last_ts - self.interval)
+        self.last_ts = ts
+        # задержка кадра до UI (в конвейере - время FaceMesh), оценка снизу
+        self.lag = min(max(time.time() - ts, 0.0), self.lag + 0.001)
+        self.frames += 1
+        if meshed: self.meshed += 1
+
+    def stride(self, mode, states, flash_state=0):
+        # 0 - FaceMesh не нужен, N - на каждом N-м кадре
+        if not self.settings["enabled"]: return 1
+        if mode in ("IDLE", "TRAIN"): return 0
+        if mode == "SECURITY" and not flash_state and states and all(s in ("ok", "fail") for s in states):
+            return self.settings["settled_stride"]
+        return 1
+
+    def want_mesh(self, stride):
+        self.report["stride"] = stride
+        if stride == 0: return False
+        if self.skipped + 1 >= stride:
+            self.skipped = 0
+            self.meshed += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def want_render(self, mode, now):
+        if self.settings["enabled"] and mode == "IDLE" and now - self.last_render < 1.0 / self.settings["idle_fps"]:
+            return False
+        self.last_render = now
+        self.rendered += 1
+        return True
+
+    def delay(self, now):
+        # проснуться к ожидаемому следующему кадру, а не каждые 10 мс
+        s = self.settings
+        if not s["enabled"] or self.last_ts is None: return 10
+        due = (self.last_ts + self.interval + self.lag - now) * 1000.0
+        return int(min(max(due, s["min_delay"]), s["max_delay"]))
+
+    def begin(self):
+        return time.perf_counter()
+
+    def end(self, t0):
+        now = time.perf_counter()
+        self.busy += now - t0
+        span = now - self.window_start
+        if span < self.settings["report_interval"]: return
+        self.report.update(duty=self.busy / span, fps=self.frames / span,
+                           mesh_fps=self.meshed / span, render_fps=self.rendered / span)
+        STATS.gauges["scheduler"] = dict(self.report)
+        self.window_start = now
+        self.busy = 0.0
+        self.frames = self.meshed = self.rendered = 0
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing as mp
+import cv2
+from config import THRESHOLDS, FRAME_WIDTH, FRAME_HEIGHT
+from engine import LivenessEngine
+from evaluate import read_frames
+
+_worker = {}
+
+def load_model():
+    from face_id import FaceIDSystem
+    return FaceIDSystem()
+
+def init_worker(opts, events):
+    _worker["opts"] = opts
+    _worker["events"] = events
+    # при fork модель уже загружена в родителе и общая (copy-on-write)
+    if "id_sys" not in _worker: _worker["id_sys"] = load_model()
+
+def open_source(src, opts):
+    if src.isdigit() or not os.path.exists(src):
+        from camera import CameraStream
+        cap = CameraStream(int(src) if src.isdigit() else src, FRAME_WIDTH, FRAME_HEIGHT, fps=opts["fps"],
+                           max_failures=opts["max_failures"])
+        if not cap.open(): return None, None
+        cap.start()
+        def frames():
+            while cap.running:
+                ret, frame, ts = cap.read()
+                if ret: yield frame, ts
+                else: time.sleep(0.002)
+        return frames(), cap
+    return read_frames(src, opts["fps"]), None
+
+def run_stream(job):
+    camera, src = job
+    opts = _worker["opts"]
+    events = _worker["events"]
+    id_sys = _worker["id_sys"]
+    from lpad_core import FaceProcessor
+    thresholds = THRESHOLDS.copy()
+    thresholds.update(opts["thresholds"])
+    publish = lambda kind, **data: events.put(dict(data, type=kind, camera=camera, source=src))
+
+    frames, cap = open_source(src, opts)
+    if frames is None:
+        publish("error", ts=time.time(), reason="source not opened")
+        return {"camera": camera, "source": src, "frames": 0, "decisions": 0}
+    proc = FaceProcessor()
+    engine = LivenessEngine(thresholds)
+
+    publish("started", ts=time.time())
+    count = decisions = 0
+    flash_state = 0
+    try:
+        for frame, ts in frames:
+            if opts["flip"]: frame = cv2.flip(frame, 1)
+            count += 1
+            res = proc.process(frame)
+            decided = engine.step_faces(res["faces"], ts, lambda tracks: id_sys.recognize_batch(frame, [t.bbox for t in tracks]))
+            # дисплей двери включает/выключает подсветку по этим событиям
+            if engine.flash_state != flash_state:
+                flash_state = engine.flash_state
+                publish("flash", ts=ts, state=flash_state, users=[s.user for s in engine.participants()])
+            for event in decided:
+                if event["final"]: decisions += 1
+                publish("decision", **event)
+        # камера/URL: цикл кончается, только когда поток пропал
+        if cap is not None: publish("error", ts=time.time(), reason="stream lost")
+    finally:
+        if cap is not None: cap.release()
+    publish("stopped", ts=time.time(), frames=count)
+    return {"camera": camera, "source": src, "frames": count, "decisions": decisions}
+
+def publish_events(events, out):
+    while True:
+        event = events.get()
+        if event is None: break
+        line = json.dumps(event, ensure_ascii=False)
+        print(line, flush=True)
+        if out:
+            out.write(line + "\n")
+            out.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless L-PAD service: one liveness/recognition pipeline "
+                                     "per video source (camera index, video file, frame folder or URL). "
+                                     "Access decisions are printed as JSON lines.")
+    parser.add_argument("sources", nargs="+")
+    parser.add_argument("--workers", type=int, default=None, help="default: one process per source, at most cpu_count")
+    parser.add_argument("--fps", type=float, default=30.0, help="camera FPS / timestamps for files without them")
+    parser.add_argument("--flip", action="store_true", help="mirror frames like the live app")
+    parser.add_argument("--thresholds", default="{}", help="JSON with THRESHOLDS overrides")
+    parser.add_argument("--events", help="append events to this JSONL file")
+    parser.add_argument("--max-failures", type=int, default=300,
+                        help="stop a camera/URL source after this many failed reads in a row (0 = never)")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or min(len(args.sources), os.cpu_count())
+    if workers < len(args.sources):
+        print(f"[INFO] Источников больше, чем процессов ({workers}): часть потоков будет ждать.", file=sys.stderr)
+    opts = {"fps": args.fps, "flip": args.flip, "thresholds": json.loads(args.thresholds),
+            "max_failures": args.max_failures}
+
+    id_sys = load_model()
+    if not id_sys.trained:
+        print("[ERR] База пуста! Сначала добавьте пользователя.", file=sys.stderr)
+        return 1
+    # при spawn процессы загружают модель сами, проверка выше - до их запуска
+    if mp.get_start_method() == "fork": _worker["id_sys"] = id_sys
+
+    events = mp.Queue()
+    out = open(args.events, "a", encoding="utf-8") if args.events else None
+    publisher = threading.Thread(target=publish_events, args=(events, out), daemon=True)
+    publisher.start()
+
+    print(f"[INFO] Источников: {len(args.sources)}, процессов: {workers}", file=sys.stderr)
+    pool = mp.Pool(workers, initializer=init_worker, initargs=(opts, events))
+    try:
+        for r in pool.imap_unordered(run_stream, list(enumerate(args.sources))):
+            print(f"[OK] cam{r['camera']} {r['source']}: кадров {r['frames']}, решений {r['decisions']}", file=sys.stderr)
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+    pool.join()
+    events.put(None)
+    publisher.join()
+    if out: out.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
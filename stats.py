@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+from config import STATS_SETTINGS
+
+class StageWindow:
+    def __init__(self, size):
+        self.buf = np.zeros(size, dtype=np.float32)
+        self.n = 0
+        self.first = 0.0
+        self.last = 0.0
+
+    def add(self, ms, now):
+        self.buf[self.n % len(self.buf)] = ms
+        self.n += 1
+        if self.n == 1: self.first = now
+        self.last = now
+
+    def summary(self):
+        count = min(self.n, len(self.buf))
+        if not count: return None
+        v = self.buf[:count]
+        p50, p95, p99 = np.percentile(v, (50, 95, 99))
+        span = self.last - self.first
+        return {"count": self.n, "mean_ms": float(v.mean()), "p50_ms": float(p50), "p95_ms": float(p95),
+                "p99_ms": float(p99), "max_ms": float(v.max()), "rate": (self.n - 1) / span if span > 0 else 0.0}
+
+class RuntimeStats:
+    def __init__(self, settings=STATS_SETTINGS):
+        self.settings = settings
+        self.enabled = self.required
+        self.stages = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+        self.server = None
+        self.dumper = None
+
+    @property
+    def required(self):
+        # без оверлея таймеры нужны только для снимка в файл или HTTP
+        s = self.settings
+        return bool(s["enabled"] or s["dump_file"] or s["http_port"])
+
+    def set_overlay(self, on):
+        self.enabled = on or self.required
+
+    def clock(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def stop(self, stage, t0):
+        # t0 == 0.0: замер начат, пока статистика была выключена
+        if not self.enabled or not t0: return
+        now = time.perf_counter()
+        w = self.stages.get(stage)
+        if w is None:
+            with self.lock: w = self.stages.setdefault(stage, StageWindow(self.settings["window"]))
+        w.add((now - t0) * 1000.0, now)
+
+    def reset(self):
+        with self.lock: self.stages = {}
+
+    def snapshot(self):
+        with self.lock: stages = dict(self.stages)
+        out = {}
+        for name, w in stages.items():
+            s = w.summary()
+            if s is not None: out[name] = s
+        return {"ts": time.time(), "enabled": self.enabled, "stages": out, "gauges": dict(self.gauges)}
+
+    def lines(self):
+        snap = self.snapshot()["stages"]
+        return [f"{name:<10} {s['p50_ms']:6.1f} {s['p95_ms']:6.1f} {s['p99_ms']:6.1f} ms" for name, s in snap.items()]
+
+    def dump(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(tmp, path)
+
+    def start_dump(self, path, interval):
+        def run():
+            while True:
+                time.sleep(interval)
+                try: self.dump(path)
+                except Exception as e: print(f"[ERR] Не удалось записать статистику: {e}")
+        self.dumper = threading.Thread(target=run, name="StatsDump", daemon=True)
+        self.dumper.start()
+
+    def serve(self, port):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        stats = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/stats"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(stats.snapshot(), indent=1).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args): pass
+
+        # только loopback
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="StatsHTTP", daemon=True).start()
+        return self.server.server_address[1]
+
+    def start(self):
+        s = self.settings
+        if s["dump_file"]: self.start_dump(s["dump_file"], s["dump_interval"])
+        if s["http_port"]:
+            try: print(f"[INFO] Статистика: http://127.0.0.1:{self.serve(s['http_port'])}/stats")
+            except OSError as e: print(f"[ERR] HTTP статистики не запущен: {e}")
+
+STATS = RuntimeStats()
@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing as mp
+import numpy as np
+from config import THRESHOLDS, FLASH_SETTINGS, DATA_DIR
+from evaluate import find_sessions, read_frames
+
+TRACE_DIR = os.path.join(DATA_DIR, "traces")
+TRACE_VERSION = 1
+# доля пикселей лица ярче t для t = TAIL_FROM..255 (specular_threshold в этом диапазоне)
+TAIL_FROM = 200
+SWEEP_KEYS = ("min_flash_diff", "max_flash_diff", "min_3d_ratio", "dark_margin", "specular_threshold", "specular_ratio")
+DEFAULT_GRID = {
+    "min_flash_diff": np.linspace(5, 40, 8),
+    "max_flash_diff": np.linspace(100, 220, 7),
+    "min_3d_ratio": np.linspace(1.1, 1.5, 9),
+    "dark_margin": np.linspace(10, 50, 5),
+    "specular_threshold": np.array([230, 240, 245, 250, 254]),
+    "specular_ratio": np.array([0.005, 0.01, 0.02, 0.05])
+}
+
+def trace_path(session, opts):
+    path = os.path.abspath(session["path"])
+    st = os.stat(path)
+    key = f"{path}|{st.st_mtime_ns}|{st.st_size}|{opts['fps']}|{opts['flip']}|{TRACE_VERSION}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(opts["cache"], f"{os.path.basename(path)}_{digest}.npz")
+
+def trace_session(job):
+    session, path, opts = job
+    if os.path.exists(path) and not opts["refresh"]: return path, False
+    import cv2
+    from lpad_core import FaceProcessor
+    from anti_spoofing import LumaPlane
+    proc = FaceProcessor(use_gate=False)
+    cols = {"ts": [], "detected": [], "bbox": [], "brightness": [], "light_center": [], "light_edge": [], "tail": []}
+    empty = np.zeros(256 - TAIL_FROM, dtype=np.float32)
+    for frame, ts in read_frames(session["path"], opts["fps"]):
+        if opts["flip"]: frame = cv2.flip(frame, 1)
+        res = proc.process(frame)
+        tail = empty
+        if res["detected"]:
+            gray = LumaPlane(frame, res["bbox"]).gray
+            if gray.size:
+                above = np.cumsum(np.bincount(gray.ravel(), minlength=256)[::-1])[::-1]
+                tail = np.append(above[TAIL_FROM + 1:], 0) / gray.size
+        cols["ts"].append(ts)
+        cols["detected"].append(res["detected"])
+        cols["bbox"].append(res["bbox"] if res["detected"] else (0, 0, 0, 0))
+        for k in ("brightness", "light_center", "light_edge"): cols[k].append(res[k])
+        cols["tail"].append(tail)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, ts=np.array(cols["ts"], dtype=np.float64),
+                            detected=np.array(cols["detected"], dtype=bool),
+                            bbox=np.array(cols["bbox"], dtype=np.int32).reshape(-1, 4),
+                            brightness=np.array(cols["brightness"], dtype=np.float32),
+                            light_center=np.array(cols["light_center"], dtype=np.float32),
+                            light_edge=np.array(cols["light_edge"], dtype=np.float32),
+                            tail=np.array(cols["tail"], dtype=np.float32).reshape(-1, 256 - TAIL_FROM))
+    os.replace(tmp, path)
+    return path, True
+
+def load_trace(path):
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+def attempt_table(trace, attempts, flash=FLASH_SETTINGS):
+    # Расписание фаз (без последовательного выхода) от порогов не зависит:
+    # прогоняем движок с заведомо проваленными попытками и размечаем кадры.
+    from engine import LivenessEngine
+    fl = dict(flash, sequential=False)
+    engine = LivenessEngine(dict(THRESHOLDS, min_3d_ratio=np.inf, max_flash_attempts=attempts), flash_settings=fl)
+    identify = lambda tracks: [("subject", 100)] * len(tracks)
+    det, ts, b = trace["detected"], trace["ts"], trace["brightness"]
+    rows = []
+    cur = owner = None
+    base = 0.0
+    for i in range(len(ts)):
+        s = engine.session
+        if det[i] and s is not None and s.in_flash:
+            if cur is None: cur, owner = {"dark": [], "light": []}, s
+            if engine.flash_state == 1: cur["dark"].append(i)
+            elif ts[i] - engine.flash_timer > fl["light_settle"]: cur["light"].append(i)
+        scanning = s is None or s.sec_state == "scan"
+        faces = []
+        if det[i]:
+            faces = [{"bbox": tuple(int(v) for v in trace["bbox"][i]), "brightness": float(b[i]),
+                      "light_center": float(trace["light_center"][i]), "light_edge": float(trace["light_edge"][i]),
+                      "glare": False}]
+        events = engine.step_faces(faces, ts[i], identify)
+        if scanning and engine.session is not None and engine.session.sec_state == "flash_check": base = float(b[i])
+        for event in events:
+            dark, light = cur["dark"], cur["light"]
+            rows.append((b[dark].min() if dark else 255.0, b[light].max() if light else 0.0,
+                         trace["light_center"][light].max() if light else 0.0,
+                         trace["light_edge"][light].max() if light else 0.0, base, i))
+            cur = owner = None
+            if event["final"]: return rows
+        # лицо потеряно посреди попытки - попытка не состоялась
+        if owner is not None and owner.track.id not in engine.sessions: cur = owner = None
+    return rows
+
+def build_table(traces, attempts):
+    cols, tails, session_idx = [], [], []
+    for si, trace in enumerate(traces):
+        for row in attempt_table(trace, attempts):
+            cols.append(row[:5])
+            tails.append(trace["tail"][row[5]])
+            session_idx.append(si)
+    cols = np.array(cols, dtype=np.float64).reshape(-1, 5)
+    dark, light, center, edge, base = cols.T
+    return {"dark": dark, "diff": light - dark, "ratio": center / (edge + 0.1), "base": base,
+            "tail": np.array(tails, dtype=np.float32).reshape(-1, 256 - TAIL_FROM),
+            "session": np.array(session_idx, dtype=np.int64), "sessions": len(traces)}
+
+def verdicts(table, configs):
+    # (конфигурации, попытки): то же, что FaceSession.verdict, для всех сразу
+    p = {k: configs[:, j][:, None] for j, k in enumerate(SWEEP_KEYS)}
+    dark, diff, ratio, base = table["dark"], table["diff"], table["ratio"], table["base"]
+    col = np.clip(p["specular_threshold"][:, 0].astype(np.int64) - TAIL_FROM, 0, table["tail"].shape[1] - 1)
+    glare = table["tail"][:, col].T > p["specular_ratio"]
+    min_diff = np.where(base > 150, 10.0, p["min_flash_diff"])
+    return ((dark <= base + p["dark_margin"]) & ~glare & (diff >= min_diff) &
+            ~((diff > p["max_flash_diff"]) & (ratio <= 1.50)) & (ratio >= p["min_3d_ratio"]))
+
+def sweep(table, configs, genuine, chunk=2048):
+    has = np.unique(table["session"])
+    starts = np.searchsorted(table["session"], has)
+    apcer = np.zeros(len(configs))
+    bpcer = np.zeros(len(configs))
+    for lo in range(0, len(configs), chunk):
+        passed = verdicts(table, configs[lo:lo + chunk])
+        accepted = np.zeros((len(passed), table["sessions"]), dtype=bool)
+        # сессия принята, если прошла любая из попыток
+        if len(starts): accepted[:, has] = np.logical_or.reduceat(passed, starts, axis=1)
+        apcer[lo:lo + chunk] = accepted[:, ~genuine].mean(axis=1) if (~genuine).any() else np.nan
+        bpcer[lo:lo + chunk] = 1.0 - accepted[:, genuine].mean(axis=1) if genuine.any() else np.nan
+    return apcer, bpcer
+
+def make_grid(overrides):
+    grid = {k: np.asarray(overrides.get(k, DEFAULT_GRID[k]), dtype=np.float64).ravel() for k in SWEEP_KEYS}
+    mesh = np.meshgrid(*grid.values(), indexing="ij")
+    return grid, np.stack([m.ravel() for m in mesh], axis=1)
+
+def det_curve(apcer, bpcer):
+    # Парето-фронт: для каждой APCER лучшая BPCER
+    order = np.lexsort((bpcer, apcer))
+    front, best = [], np.inf
+    for i in order:
+        if bpcer[i] < best:
+            front.append(int(i))
+            best = bpcer[i]
+    return front
+
+def operating_points(configs, apcer, bpcer, front, targets):
+    point = lambda i: {"apcer": float(apcer[i]), "bpcer": float(bpcer[i]),
+                       "thresholds": {k: float(configs[i, j]) for j, k in enumerate(SWEEP_KEYS)}}
+    f = np.array(front)
+    points = {"eer": point(f[np.argmin(np.maximum(apcer[f], bpcer[f]))])}
+    for t in targets:
+        ok = f[apcer[f] <= t]
+        if len(ok): points[f"apcer<={t:g}"] = point(ok[np.argmin(bpcer[ok])])
+    return points
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Threshold sweep for Flash Liveness. FaceMesh runs once per "
+                                     "recorded session (same layout as evaluate.py) and per-frame features are "
+                                     "cached; threshold grids are then evaluated with NumPy, reporting APCER/BPCER, "
+                                     "the DET/ROC front and recommended operating points.")
+    parser.add_argument("roots", nargs="+")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--fps", type=float, default=30.0, help="timestamps for sessions without them")
+    parser.add_argument("--flip", action="store_true", help="mirror frames like the live app")
+    parser.add_argument("--cache", default=TRACE_DIR, help="feature trace cache folder")
+    parser.add_argument("--refresh", action="store_true", help="recompute cached traces")
+    parser.add_argument("--grid", default="{}", help='JSON {"min_3d_ratio": [1.2, 1.3], ...} overriding default value lists')
+    parser.add_argument("--attempts", type=int, default=THRESHOLDS["max_flash_attempts"])
+    parser.add_argument("--targets", default="0.01,0.05", help="APCER targets for operating points")
+    parser.add_argument("--out", help="write the report (points, DET/ROC front) as JSON")
+    parser.add_argument("--csv", help="write APCER/BPCER of every configuration")
+    args = parser.parse_args(argv)
+
+    sessions = find_sessions(args.roots)
+    if not sessions:
+        print("[ERR] Сессии не найдены!")
+        return 1
+    os.makedirs(args.cache, exist_ok=True)
+    opts = {"fps": args.fps, "flip": args.flip, "cache": args.cache, "refresh": args.refresh}
+    jobs = [(s, trace_path(s, opts), opts) for s in sessions]
+
+    t = time.time()
+    todo = [j for j in jobs if args.refresh or not os.path.exists(j[1])]
+    if todo:
+        print(f"[INFO] Трассы признаков: {len(todo)} из {len(jobs)} сессий, процессов: {args.workers}")
+        with mp.Pool(min(args.workers, len(todo))) as pool:
+            for path, _ in pool.imap_unordered(trace_session, todo): print(f"  {os.path.basename(path)}")
+        print(f"[OK] Трассы готовы за {time.time() - t:.1f} с")
+    traces = [load_trace(path) for _, path, _ in jobs]
+    genuine = np.array([s["genuine"] for s in sessions])
+
+    t = time.time()
+    table = build_table(traces, args.attempts)
+    grid, configs = make_grid(json.loads(args.grid))
+    current = np.array([[THRESHOLDS[k] for k in SWEEP_KEYS]], dtype=np.float64)
+    apcer, bpcer = sweep(table, np.vstack((configs, current)), genuine)
+    cur_apcer, cur_bpcer = apcer[-1], bpcer[-1]
+    apcer, bpcer = apcer[:-1], bpcer[:-1]
+    print(f"[OK] Конфигураций: {len(configs)}, попыток: {len(table['dark'])}, за {time.time() - t:.2f} с")
+
+    fmt = lambda v: "n/a" if np.isnan(v) else f"{v * 100:.2f}%"
+    front = det_curve(np.nan_to_num(apcer), np.nan_to_num(bpcer))
+    points = operating_points(configs, np.nan_to_num(apcer), np.nan_to_num(bpcer), front,
+                              [float(v) for v in args.targets.split(",") if v])
+    print(f"     текущие пороги: APCER={fmt(cur_apcer)} BPCER={fmt(cur_bpcer)}")
+    for name, p in points.items():
+        print(f"     {name:<12} APCER={fmt(p['apcer'])} BPCER={fmt(p['bpcer'])} {json.dumps(p['thresholds'])}")
+
+    if args.out:
+        report = {"sessions": len(sessions), "genuine": int(genuine.sum()), "attacks": int((~genuine).sum()),
+                  "configs": len(configs), "grid": {k: v.tolist() for k, v in grid.items()},
+                  "current": {"apcer": float(cur_apcer), "bpcer": float(cur_bpcer)}, "points": points,
+                  "det": [[float(apcer[i]), float(bpcer[i])] for i in front],
+                  "roc": [[float(apcer[i]), float(1.0 - bpcer[i])] for i in front]}
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.csv:
+        np.savetxt(args.csv, np.column_stack((configs, apcer, bpcer)), delimiter=",", fmt="%.6g",
+                   header=",".join(SWEEP_KEYS + ("apcer", "bpcer")), comments="")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from mediapipe.framework.formats import landmark_pb2
+from lpad_core import FaceProcessor
+
+def make_mesh(n, seed=0, with_z=True, visibility=False):
+    rng = np.random.default_rng(seed)
+    mesh = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in rng.uniform(-0.1, 1.1, (n, 3)):
+        lm = mesh.landmark.add()
+        lm.x, lm.y = x, y
+        if with_z: lm.z = z
+        if visibility: lm.visibility = 0.9
+    return mesh
+
+def by_attributes(mesh, w, h):
+    return np.array([(lm.x * w, lm.y * h) for lm in mesh.landmark]).astype(np.int32)
+
+@pytest.mark.parametrize("n", [468, 478])
+def test_parsed_matches_attributes(n):
+    mesh = make_mesh(n)
+    out = FaceProcessor.landmarks_to_array(mesh, 1280, 720)
+    assert out.dtype == np.int32
+    assert np.array_equal(out, by_attributes(mesh, 1280, 720))
+
+def test_zero_coordinates():
+    mesh = make_mesh(478)
+    mesh.landmark[0].x = mesh.landmark[0].y = mesh.landmark[0].z = 0.0
+    assert np.array_equal(FaceProcessor.landmarks_to_array(mesh, 640, 480), by_attributes(mesh, 640, 480))
+
+@pytest.mark.parametrize("n, kwargs", [(10, {}), (477, {}), (478, {"with_z": False}), (468, {"visibility": True})])
+def test_fallback(n, kwargs):
+    mesh = make_mesh(n, seed=1, **kwargs)
+    assert np.array_equal(FaceProcessor.landmarks_to_array(mesh, 1280, 720), by_attributes(mesh, 1280, 720))
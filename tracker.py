@@ -0,0 +1,94 @@
+import numpy as np
+from config import TRACK_SETTINGS
+
+def bbox_iou(a, b):
+    if a is None or b is None: return 0.0
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+class FaceTrack:
+    def __init__(self, track_id, bbox, landmarks, now):
+        self.id = track_id
+        self.bbox = bbox
+        self.landmarks = landmarks
+        self.started = now
+        self.last_seen = now
+        self.name = None
+        self.score = 0
+        self.identity_bbox = None
+        self.identity_ts = 0.0
+
+    def remember(self, name, score, now):
+        self.name = name
+        self.score = score
+        self.identity_bbox = self.bbox
+        self.identity_ts = now
+
+class FaceTracker:
+    def __init__(self, settings=TRACK_SETTINGS):
+        self.settings = settings
+        self.tracks = []
+        self.track = None
+        self.next_id = 1
+
+    def reset(self):
+        self.tracks = []
+        self.track = None
+
+    def continues(self, t, bbox, landmarks):
+        if bbox_iou(t.bbox, bbox) < self.settings["min_iou"]: return False
+        if t.landmarks is not None and landmarks is not None and len(t.landmarks) == len(landmarks):
+            size = max(bbox[2] - bbox[0], bbox[3] - bbox[1], 1)
+            shift = np.abs(np.asarray(landmarks) - t.landmarks).mean() / size
+            if shift > self.settings["max_shift"]: return False
+        return True
+
+    def update_faces(self, faces, now, keep=()):
+        # keep - треки, которые не истекают по max_gap (идет вспышка)
+        self.tracks = [t for t in self.tracks if t.id in keep or now - t.last_seen <= self.settings["max_gap"]]
+        pairs = sorted(((bbox_iou(t.bbox, f["bbox"]), ti, fi) for ti, t in enumerate(self.tracks)
+                        for fi, f in enumerate(faces)), reverse=True)
+        matched = [None] * len(faces)
+        used = set()
+        for iou, ti, fi in pairs:
+            if iou < self.settings["min_iou"]: break
+            if ti in used or matched[fi] is not None: continue
+            t, face = self.tracks[ti], faces[fi]
+            if not self.continues(t, face["bbox"], face.get("landmarks")): continue
+            t.bbox, t.landmarks, t.last_seen = face["bbox"], face.get("landmarks"), now
+            matched[fi] = t
+            used.add(ti)
+        for fi, face in enumerate(faces):
+            if matched[fi] is None:
+                matched[fi] = FaceTrack(self.next_id, face["bbox"], face.get("landmarks"), now)
+                self.next_id += 1
+                self.tracks.append(matched[fi])
+        if faces: self.track = matched[0]
+        elif self.track not in self.tracks: self.track = None
+        return matched
+
+    def update(self, res, now):
+        self.update_faces([res] if res["detected"] else [], now)
+        return self.track
+
+    def needs_identity(self, t, now, min_score=50):
+        known = t.name not in (None, "Unknown", "Error") and t.score > min_score
+        if known and bbox_iou(t.identity_bbox, t.bbox) >= self.settings["drift_iou"]: return False
+        if not known and t.name is not None and now - t.identity_ts < self.settings["retry_interval"]: return False
+        return True
+
+    def identify_faces(self, tracks, identify, now, min_score=50):
+        todo = [t for t in tracks if self.needs_identity(t, now, min_score)]
+        pending = set()
+        if todo:
+            for t, result in zip(todo, identify(todo)):
+                # None - ответ придет позже (асинхронное распознавание), пока лицо неизвестно
+                if result is None: pending.add(t.id)
+                else: t.remember(*result, now)
+        return [("Unknown", 0) if t.id in pending else (t.name, t.score) for t in tracks]
+
+    def identify(self, identify, now, min_score=50):
+        return self.identify_faces([self.track], lambda tracks: [identify()], now, min_score)[0]